@@ -16,13 +16,17 @@ Agent Metadata:
 
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional, Tuple
 from uagents import Agent, Context, Model, Protocol
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 import sys
 import requests
+from requests.adapters import HTTPAdapter
 import base64
 from datetime import datetime, timedelta
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -51,6 +55,10 @@ class GroceryItem(BaseModel):
     brand: Optional[str] = Field(default=None, description="Product brand")
 
 
+# Serializes a whole item list in one call into pydantic-core
+grocery_items_adapter = TypeAdapter(List[GroceryItem])
+
+
 class GroceryResponse(BaseModel):
     """Grocery list response with Kroger data"""
     agent: str = Field(default="GroceryAgent", description="Agent name")
@@ -87,6 +95,26 @@ KROGER_API_BASE = os.getenv("KROGER_API_BASE", "https://api.kroger.com/v1")
 KROGER_LOCATION_ID = os.getenv("KROGER_LOCATION_ID", "01400441")  # Default location ID
 _kroger_token = None
 _token_expiry = None
+_kroger_token_lock = threading.Lock()
+
+# Kroger lookups are network-bound, so ingredients are priced concurrently, at most this many at once
+KROGER_MAX_CONCURRENT_SEARCHES = 8
+kroger_search_executor = ThreadPoolExecutor(
+    max_workers=KROGER_MAX_CONCURRENT_SEARCHES,
+    thread_name_prefix="kroger-search"
+)
+
+# One keep-alive pool shared by all searches, sized to the executor, so TLS handshakes are reused
+kroger_session = requests.Session()
+kroger_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=KROGER_MAX_CONCURRENT_SEARCHES))
+
+# Catalog matches change slowly and ingredients recur across recipes and users, so a found
+# product is reused for an hour. Misses are not cached: they may be transient API failures.
+KROGER_PRODUCT_CACHE_SIZE = 4096
+KROGER_PRODUCT_CACHE_TTL_SECONDS = 3600
+kroger_product_cache = TTLCache(maxsize=KROGER_PRODUCT_CACHE_SIZE, ttl=KROGER_PRODUCT_CACHE_TTL_SECONDS)
+kroger_product_cache_lock = threading.Lock()
+kroger_product_cache_stats = {"hits": 0, "misses": 0}
 
 
 # Mock price database for common ingredients
@@ -164,8 +192,6 @@ def get_kroger_token() -> Optional[str]:
     Get Kroger API OAuth token. Caches token until expiry.
     Returns None if credentials are not configured.
     """
-    global _kroger_token, _token_expiry
-    
     # Check if we have valid credentials
     if not KROGER_CLIENT_ID or not KROGER_CLIENT_SECRET:
         return None
@@ -177,6 +203,17 @@ def get_kroger_token() -> Optional[str]:
     if _kroger_token and _token_expiry and datetime.now() < _token_expiry:
         return _kroger_token
     
+    # Concurrent searches wait for a single token request instead of each sending one
+    with _kroger_token_lock:
+        if _kroger_token and _token_expiry and datetime.now() < _token_expiry:
+            return _kroger_token
+        return _request_kroger_token()
+
+
+def _request_kroger_token() -> Optional[str]:
+    """Request a new Kroger OAuth token and cache it (caller holds _kroger_token_lock)"""
+    global _kroger_token, _token_expiry
+    
     try:
         # Request new token
         auth_string = f"{KROGER_CLIENT_ID}:{KROGER_CLIENT_SECRET}"
@@ -193,7 +230,7 @@ def get_kroger_token() -> Optional[str]:
             "scope": "product.compact"
         }
         
-        response = requests.post(
+        response = kroger_session.post(
             f"{KROGER_API_BASE}/connect/oauth2/token",
             headers=headers,
             data=data,
@@ -218,6 +255,30 @@ def get_kroger_token() -> Optional[str]:
 
 
 def search_kroger_product(ingredient_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Search Kroger for an ingredient, serving recently found products from kroger_product_cache.
+    """
+    key = ingredient_name.strip().lower()
+    with kroger_product_cache_lock:
+        product = kroger_product_cache.get(key)
+        kroger_product_cache_stats["hits" if product is not None else "misses"] += 1
+    if product is not None:
+        return dict(product)
+    
+    product = _search_kroger_product(ingredient_name)
+    if product is not None:
+        with kroger_product_cache_lock:
+            kroger_product_cache[key] = dict(product)
+    return product
+
+
+def get_kroger_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters and current size of the Kroger product cache"""
+    with kroger_product_cache_lock:
+        return {**kroger_product_cache_stats, "size": len(kroger_product_cache)}
+
+
+def _search_kroger_product(ingredient_name: str) -> Optional[Dict[str, Any]]:
     """
     Search for a product in Kroger's catalog using multiple search strategies.
     Based on Kroger API Products documentation: https://developer.kroger.com/documentation/api-products/public/products/overview
@@ -248,8 +309,8 @@ def search_kroger_product(ingredient_name: str) -> Optional[Dict[str, Any]]:
         try:
             logger.info(f"🔍 Trying {strategy_name} for '{ingredient_name}'")
             
-            # Properly encode the URL - requests.get will do this automatically but let's be explicit
-            response = requests.get(
+            # Properly encode the URL - requests will do this automatically but let's be explicit
+            response = kroger_session.get(
                 f"{KROGER_API_BASE}/products",
                 headers=headers,
                 params=params,
@@ -495,6 +556,17 @@ def search_and_price_ingredient(ingredient_name: str, quantity: float, unit: str
     }
 
 
+def price_ingredients(ingredients: List[Tuple[str, float, str]]) -> List[Dict[str, Any]]:
+    """
+    Search and price (name, quantity, unit) ingredients concurrently.
+    Results come back in input order, as from search_and_price_ingredient.
+    """
+    return list(kroger_search_executor.map(
+        lambda ingredient: search_and_price_ingredient(*ingredient),
+        ingredients
+    ))
+
+
 def create_grocery_list(recipe: Dict[str, Any], store: str = "Kroger") -> Tuple[Dict[str, Any], List[str]]:
     """
     Create a grocery list from recipe ingredients using Kroger API.
@@ -521,6 +593,7 @@ def create_grocery_list(recipe: Dict[str, Any], store: str = "Kroger") -> Tuple[
     
     log_agent_message("GroceryAgent", f"🔍 Searching Kroger for {len(ingredients)} ingredients...")
     
+    parsed_ingredients = []
     for ingredient in ingredients:
         # Handle both old dict format and new Ingredient object format
         if isinstance(ingredient, dict):
@@ -551,8 +624,14 @@ def create_grocery_list(recipe: Dict[str, Any], store: str = "Kroger") -> Tuple[
             unit = getattr(ingredient, 'unit', 'unit')
             notes = getattr(ingredient, 'notes', '') or ''
         
-        # Search Kroger API and get pricing details
-        item_details = search_and_price_ingredient(item_name, quantity, unit)
+        parsed_ingredients.append((item_name, quantity, unit, notes))
+    
+    # Search Kroger API and get pricing details for all ingredients at once
+    all_item_details = price_ingredients([
+        (item_name, quantity, unit) for item_name, quantity, unit, _ in parsed_ingredients
+    ])
+    
+    for (item_name, quantity, unit, notes), item_details in zip(parsed_ingredients, all_item_details):
         tools_called.append("search_and_price_ingredient")
         
         # ONLY include items found on Kroger
@@ -783,7 +862,7 @@ def generate_grocery_list(grocery_request: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "agent": "GroceryAgent",
         "store": grocery_data["store"],
-        "items": [item.model_dump() for item in grocery_data["items"]],
+        "items": grocery_items_adapter.dump_python(grocery_data["items"]),
         "total_estimated_cost": grocery_data["total_estimated_cost"],
         "kroger_items_found": kroger_count,
         "total_items": total_items,
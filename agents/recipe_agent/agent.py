@@ -16,11 +16,17 @@ Agent Metadata:
 
 import os
 import json
+import logging
+from types import MappingProxyType
 from typing import Dict, Any, List, Optional
 from uagents import Agent, Context, Model, Protocol
 from pydantic import BaseModel, Field
 import sys
 from anthropic import Anthropic
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from utils.logger import setup_logger, log_agent_message
@@ -86,32 +92,39 @@ recipe_agent = Agent(
 
 logger = setup_logger("RecipeAgent")
 
+# Claude API configuration
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+HAS_ANTHROPIC_KEY = bool(ANTHROPIC_API_KEY) and ANTHROPIC_API_KEY != "your_anthropic_api_key_here"
+_anthropic_client = None
+
 # Define the Chat Protocol v0.3.0 for ASI:One compatibility
 recipe_protocol = Protocol("chat", version="0.3.0")
 
+# Default daily macros used when the profile has no targets
+DEFAULT_TARGET_MACROS = MappingProxyType({
+    "protein_g": 140,
+    "carbs_g": 200,
+    "fat_g": 50,
+    "calories": 1800
+})
+
+# Share of the daily macros allotted to each meal type
+MEAL_DISTRIBUTION = MappingProxyType({
+    "breakfast": 0.25,
+    "lunch": 0.35,
+    "dinner": 0.30,
+    "snack": 0.10
+})
+
 
 def calculate_target_macros(user_profile: Dict[str, Any], meal_type: str) -> Dict[str, float]:
     """
     Calculate target macros for a specific meal based on user profile.
     Distributes daily macros across meals.
     """
-    target_macros = user_profile.get("target_macros", {
-        "protein_g": 140,
-        "carbs_g": 200,
-        "fat_g": 50,
-        "calories": 1800
-    })
-    
-    # Distribution by meal type
-    meal_distribution = {
-        "breakfast": 0.25,
-        "lunch": 0.35,
-        "dinner": 0.30,
-        "snack": 0.10
-    }
-    
-    ratio = meal_distribution.get(meal_type, 0.33)
-    
+    target_macros = user_profile.get("target_macros") or DEFAULT_TARGET_MACROS
+    ratio = MEAL_DISTRIBUTION.get(meal_type, 0.33)
+
     return {
         "protein_g": round(target_macros["protein_g"] * ratio, 1),
         "carbs_g": round(target_macros["carbs_g"] * ratio, 1),
@@ -120,6 +133,23 @@ def calculate_target_macros(user_profile: Dict[str, Any], meal_type: str) -> Dic
     }
 
 
+def get_anthropic_client() -> Optional[Anthropic]:
+    """
+    Get the shared Claude client, creating it on first use.
+    Reusing one client keeps its HTTP connection pool warm across requests.
+    Returns None if the API key is not configured.
+    """
+    global _anthropic_client
+    
+    if not HAS_ANTHROPIC_KEY:
+        return None
+    
+    if _anthropic_client is None:
+        _anthropic_client = Anthropic(api_key=ANTHROPIC_API_KEY)
+    
+    return _anthropic_client
+
+
 def generate_recipe_image(recipe_title: str, description: str) -> str:
     """
     Generate recipe image using AI image generation.
@@ -136,17 +166,17 @@ def generate_recipe_image(recipe_title: str, description: str) -> str:
         # Pollinations.ai provides free AI-generated images
         image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=512&height=512&nologo=true"
         
-        logger.info(f"🖼️  Generated image URL for '{recipe_title}': {image_url[:100]}...")
-        log_agent_message("RecipeAgent", f"Generated AI image for recipe: {recipe_title}")
+        logger.info("🖼️  Generated image URL for '%s': %.100s...", recipe_title, image_url)
+        log_agent_message("RecipeAgent", "Generated AI image for recipe: %s", recipe_title)
         
         return image_url
         
     except Exception as e:
-        logger.warning(f"Image generation error: {e}")
+        logger.warning("Image generation error: %s", e)
         # Fallback to simple placeholder
         safe_title = recipe_title.replace(' ', '+')
         fallback_url = f"https://via.placeholder.com/512x512/FF6B6B/FFFFFF?text={safe_title}"
-        logger.info(f"Using fallback image: {fallback_url}")
+        logger.info("Using fallback image: %s", fallback_url)
         return fallback_url
 
 
@@ -177,6 +207,20 @@ def format_instructions_markdown(steps: List[str]) -> str:
     return markdown
 
 
+def strip_markdown_fence(text: str) -> str:
+    """
+    Return the body of the first ```json (or plain ```) fence in text.
+    Scans only up to the closing fence instead of splitting the whole response.
+    """
+    for fence in ("```json", "```"):
+        start = text.find(fence)
+        if start != -1:
+            start += len(fence)
+            end = text.find("```", start)
+            return text[start:end] if end != -1 else text[start:]
+    return text
+
+
 def generate_recipes_with_claude(request: RecipeRequest) -> tuple[List[Recipe], List[str]]:
     """
     Generate 4-5 recipes using Claude API with structured ingredients and markdown instructions.
@@ -196,11 +240,9 @@ def generate_recipes_with_claude(request: RecipeRequest) -> tuple[List[Recipe],
     target_macros = calculate_target_macros(user_profile, meal_type)
     
     # Try Claude API if key is available
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if api_key and api_key != "your_anthropic_api_key_here":
+    client = get_anthropic_client()
+    if client:
         try:
-            client = Anthropic(api_key=api_key)
-            
             prompt = f"""Generate 4-5 diverse {diet} {cuisine} recipes for {meal_type}. Each recipe must be unique and interesting.
 
 Requirements:
@@ -248,11 +290,8 @@ Return ONLY valid JSON (no markdown formatting) with this EXACT structure:
             # Parse Claude response
             response_text = response.content[0].text
             # Extract JSON from response (Claude might wrap it in markdown)
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0]
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0]
-            
+            response_text = strip_markdown_fence(response_text)
+
             recipes_data = json.loads(response_text.strip())
             
             # Convert to Recipe objects with structured data
@@ -285,14 +324,15 @@ Return ONLY valid JSON (no markdown formatting) with this EXACT structure:
                 
                 recipes.append(Recipe(**recipe_data))
             
-            log_agent_message("RecipeAgent", f"✨ Generated {len(recipes)} recipes using Claude API")
+            log_agent_message("RecipeAgent", "✨ Generated %d recipes using Claude API", len(recipes))
             tools_called.append("claude_api_call")
             tools_called.append("generate_recipe_image")
             return recipes, tools_called
             
         except Exception as e:
-            logger.warning(f"Claude API error: {e}. Falling back to mock recipes.")
-            logger.debug(f"Full error: {str(e)}")
+            logger.warning("Claude API error: %s. Falling back to mock recipes.", e)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Full error: %s", e)
             tools_called.append("claude_api_error")
     
     # Fallback to mock recipes
@@ -535,7 +575,7 @@ async def startup(ctx: Context):
     """Agent startup handler"""
     log_agent_message("RecipeAgent", "🚀 RecipeAgent started and ready!")
     log_agent_message("RecipeAgent", "📡 Chat Protocol v0.3.0 enabled for ASI:One")
-    logger.info(f"Agent address: {ctx.agent.address}")
+    logger.info("Agent address: %s", ctx.agent.address)
 
 
 @recipe_agent.on_message(model=RecipeRequest)
@@ -559,17 +599,17 @@ async def handle_recipe_request(ctx: Context, sender: str, msg: RecipeRequest):
             message=f"Here are {len(recipes)} personalized recipe options for you!",
             next_action="select_recipe",
             tools_called=tools_called,
-            llm_provider="claude" if os.getenv("ANTHROPIC_API_KEY") else "mock"
+            llm_provider="claude" if HAS_ANTHROPIC_KEY else "mock"
         )
         
-        log_agent_message("RecipeAgent", f"✅ Generated {len(recipes)} recipes")
-        log_agent_message("RecipeAgent", f"🔧 Tools called: {', '.join(tools_called)}")
+        log_agent_message("RecipeAgent", "✅ Generated %d recipes", len(recipes))
+        log_agent_message("RecipeAgent", "🔧 Tools called: %s", ", ".join(tools_called))
         
         # Send response back
         await ctx.send(sender, response)
         
     except Exception as e:
-        logger.error(f"Error generating recipes: {e}")
+        logger.error("Error generating recipes: %s", e)
         tools_called.append("error_handler")
         error_response = RecipeResponse(
             recipes=[],
@@ -589,8 +629,8 @@ async def handle_recipe_protocol_message(ctx: Context, sender: str, msg: RecipeR
     This is the official protocol handler for Agentverse discovery.
     Uses Claude API as backbone LLM.
     """
-    ctx.logger.info(f"[Chat Protocol v0.3.0] Received recipe request from {sender}")
-    log_agent_message("RecipeAgent", f"[Protocol] Generating recipes for {sender}")
+    ctx.logger.info("[Chat Protocol v0.3.0] Received recipe request from %s", sender)
+    log_agent_message("RecipeAgent", "[Protocol] Generating recipes for %s", sender)
     
     tools_called = ["handle_recipe_protocol_message"]
     
@@ -604,19 +644,19 @@ async def handle_recipe_protocol_message(ctx: Context, sender: str, msg: RecipeR
             message=f"Here are {len(recipes)} personalized recipe options for you!",
             next_action="select_recipe",
             tools_called=tools_called,
-            llm_provider="claude" if os.getenv("ANTHROPIC_API_KEY") else "mock"
+            llm_provider="claude" if HAS_ANTHROPIC_KEY else "mock"
         )
         
-        ctx.logger.info(f"[Chat Protocol v0.3.0] Generated {len(recipes)} recipes, sending to {sender}")
-        ctx.logger.info(f"[Chat Protocol v0.3.0] Tools called: {', '.join(tools_called)}")
-        log_agent_message("RecipeAgent", f"✅ [Protocol] Sent {len(recipes)} recipes to {sender}")
+        ctx.logger.info("[Chat Protocol v0.3.0] Generated %d recipes, sending to %s", len(recipes), sender)
+        ctx.logger.info("[Chat Protocol v0.3.0] Tools called: %s", ", ".join(tools_called))
+        log_agent_message("RecipeAgent", "✅ [Protocol] Sent %d recipes to %s", len(recipes), sender)
         
         # Send response back
         await ctx.send(sender, response)
         
     except Exception as e:
-        ctx.logger.error(f"[Chat Protocol v0.3.0] Error generating recipes: {e}")
-        logger.error(f"Error generating recipes: {e}")
+        ctx.logger.error("[Chat Protocol v0.3.0] Error generating recipes: %s", e)
+        logger.error("Error generating recipes: %s", e)
         tools_called.append("error_handler")
         error_response = RecipeResponse(
             recipes=[],
@@ -643,15 +683,18 @@ def generate_recipes(recipe_request: Dict[str, Any]) -> Dict[str, Any]:
     request = RecipeRequest(**recipe_request)
     recipes, generation_tools = generate_recipes_with_claude(request)
     tools_called.extend(generation_tools)
-    
-    return {
-        "agent": "RecipeAgent",
-        "recipes": [recipe.model_dump() for recipe in recipes],
-        "message": f"Here are {len(recipes)} personalized recipe options for you!",
-        "next_action": "select_recipe",
-        "tools_called": tools_called,
-        "llm_provider": "claude" if os.getenv("ANTHROPIC_API_KEY") else "mock"
-    }
+
+    response = RecipeResponse(
+        recipes=recipes,
+        message=f"Here are {len(recipes)} personalized recipe options for you!",
+        next_action="select_recipe",
+        tools_called=tools_called,
+        llm_provider="claude" if HAS_ANTHROPIC_KEY else "mock"
+    )
+
+    # Serialize once in pydantic-core so the result is JSON-ready primitives
+    # that can go straight to orjson without another encoder pass
+    return response.model_dump(mode="json")
 
 
 if __name__ == "__main__":
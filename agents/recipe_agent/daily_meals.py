@@ -4,102 +4,128 @@ Daily meal generation with Claude Sonnet 4 and ChromaDB
 
 import os
 import json
+import hashlib
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, List, Tuple
+import httpx
+import numpy as np
 from anthropic import Anthropic
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from chroma_service import ChromaService
+from utils.logger import setup_logger
 
 # Load environment variables
 load_dotenv()
 
+logger = setup_logger("DailyMeals")
+
+# Shared HTTP/2 connection pool so repeated Claude calls skip the TLS handshake
+anthropic_http_client = httpx.Client(
+    http2=True,
+    timeout=120,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+)
+
 # Initialize Claude client
-anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=anthropic_http_client)
 
-class DailyMealRequest(BaseModel):
-    """Request for daily meal generation"""
-    user_id: int
-    date: str  # YYYY-MM-DD format
-    preferences: Optional[Dict[str, Any]] = None
-    avoid_ingredients: Optional[List[str]] = None
-    target_calories: Optional[float] = None
+MEAL_TYPES = ("breakfast", "lunch", "dinner")
 
-class DailyMealResponse(BaseModel):
-    """Response with 3 daily recipes and optional macro validation"""
-    date: str
-    breakfast: Dict[str, Any]
-    lunch: Dict[str, Any]
-    dinner: Dict[str, Any]
-    total_calories: float
-    total_protein: float
-    total_carbs: float
-    total_fat: float
-    macro_validation: Optional[Dict[str, Any]] = None
-    message: str
-    tools_called: List[str]
-    llm_provider: str
+MACRO_NAMES = ("protein", "carbs", "fat")
+MEAL_TOTAL_FIELDS = ("calories",) + MACRO_NAMES
 
-def generate_daily_meals_with_claude(request: DailyMealRequest, chroma_service: ChromaService, user_profile) -> Tuple[DailyMealResponse, List[str]]:
-    """Generate 3 daily meals using Claude Sonnet 4 and ChromaDB preferences"""
-    
-    tools_called = ["generate_daily_meals_with_claude"]
-    
-    # Get user preferences from ChromaDB
-    user_preferences = chroma_service.get_user_preferences(request.user_id)
-    user_dislikes = chroma_service.get_user_dislikes(request.user_id)
-    
-    # Build context for Claude
-    preference_context = chroma_service.build_preference_context(user_preferences, user_dislikes)
-    
-    # Check if user has specified macro targets
-    has_macro_targets = any([
-        user_profile.target_protein_g,
-        user_profile.target_carbs_g, 
-        user_profile.target_fat_g
-    ])
-    
-    # Build macro requirements (only if user specified them)
-    macro_requirements = ""
-    if has_macro_targets:
-        macro_requirements = f"""
+# Relative deviation from a macro target that still counts as met
+MACRO_TOLERANCE = 0.1
+
+# Stdlib decoder for Claude's free-form responses; stored documents go through orjson
+JSON_DECODER = json.JSONDecoder()
+
+# Worker pool that embeds meals while the Claude response is still streaming
+embedding_executor = ThreadPoolExecutor(max_workers=len(MEAL_TYPES), thread_name_prefix="meal-embedding")
+
+DAILY_MEALS_MODEL = "claude-sonnet-4-20250514"
+
+# Prompt templates, filled with str.format per request
+DAILY_MACRO_REQUIREMENTS_TEMPLATE = """
         Target Macros (user-specified):
-        - Protein: {user_profile.target_protein_g}g per day
-        - Carbs: {user_profile.target_carbs_g}g per day  
-        - Fats: {user_profile.target_fat_g}g per day
+        - Protein: {protein}g per day
+        - Carbs: {carbs}g per day  
+        - Fats: {fat}g per day
         
         Requirements:
         1. Each meal should be nutritionally balanced and meet the user's macro targets
         2. Distribute macros across the 3 meals (breakfast ~25%, lunch ~35%, dinner ~40%)
         3. Ensure total daily macros align with user's targets
         """
-    else:
-        macro_requirements = """
+
+DAILY_DEFAULT_REQUIREMENTS = """
         Requirements:
         1. Each meal should be nutritionally balanced for a healthy 2000-calorie diet
         2. Focus on whole foods, lean proteins, complex carbs, and healthy fats
         3. Ensure variety and nutritional completeness across all meals
         """
-    
-    # Enhanced Claude prompt with conditional macro requirements
-    claude_prompt = f"""
+
+DAILY_MEALS_PROMPT_TEMPLATE = """
     Generate 3 daily meals (breakfast, lunch, dinner) for a user with these preferences:
     
     User Context: {preference_context}
-    Target Date: {request.date}
-    Target Calories: {request.target_calories or user_profile.daily_calories}
+    Target Date: {date}
+    Target Calories: {calories}
     {macro_requirements}
     
     Additional Requirements:
-    4. Avoid these ingredients: {user_dislikes}
-    5. Consider user's dietary restrictions: {user_profile.dietary_restrictions}
-    6. Incorporate user's flavor preferences: {user_profile.likes}
+    4. Avoid these ingredients: {dislikes}
+    5. Consider user's dietary restrictions: {restrictions}
+    6. Incorporate user's flavor preferences: {likes}
     7. Generate structured recipes with exact ingredients and quantities
     8. Include cooking instructions in markdown format
     9. Generate an AI image for each recipe
+    """
+
+SINGLE_MEAL_MACRO_REQUIREMENTS_TEMPLATE = """
+        Target Macros for {meal_type} (user-specified daily targets):
+        - Protein: {protein}g per day
+        - Carbs: {carbs}g per day  
+        - Fats: {fat}g per day
+        
+        Requirements:
+        1. This {meal_type} should contribute appropriately to daily macro targets
+        2. Focus on nutritional balance and macro distribution
+        """
+
+SINGLE_MEAL_DEFAULT_REQUIREMENTS_TEMPLATE = """
+        Requirements:
+        1. This {meal_type} should be nutritionally balanced and healthy
+        2. Focus on whole foods and nutritional completeness
+        """
+
+SINGLE_MEAL_PROMPT_TEMPLATE = """
+    Generate a {meal_type} recipe for a user with these preferences:
+    
+    User Context: {preference_context}
+    Target Date: {date}
+    Target Calories: {calories}
+    {macro_requirements}
+    
+    Additional Requirements:
+    3. Avoid these ingredients: {dislikes}
+    4. Consider user's dietary restrictions: {restrictions}
+    5. Incorporate user's flavor preferences: {likes}
+    6. Generate structured recipe with exact ingredients and quantities
+    7. Include cooking instructions in markdown format
+    8. Generate an AI image for the recipe
     
+    Return JSON format with the {meal_type} recipe.
+    Include detailed macro breakdown per serving.
+    """
+
+# Output-format block appended after the user-specific daily meals prompt
+DAILY_MEALS_FORMAT_INSTRUCTIONS = """
     IMPORTANT: Return ONLY valid JSON in this exact format:
-    {{
-        "breakfast": {{
+    {
+        "breakfast": {
             "title": "Recipe Title",
             "description": "Brief description",
             "cook_time": "X minutes",
@@ -108,12 +134,12 @@ def generate_daily_meals_with_claude(request: DailyMealRequest, chroma_service:
             "carbs": 50,
             "fat": 15,
             "ingredients": [
-                {{"name": "ingredient name", "quantity": "amount", "unit": "unit"}}
+                {"name": "ingredient name", "quantity": "amount", "unit": "unit"}
             ],
             "instructions": "Step-by-step instructions in markdown",
             "image_url": "https://via.placeholder.com/400x300?text=Recipe+Image"
-        }},
-        "lunch": {{
+        },
+        "lunch": {
             "title": "Recipe Title",
             "description": "Brief description", 
             "cook_time": "X minutes",
@@ -122,12 +148,12 @@ def generate_daily_meals_with_claude(request: DailyMealRequest, chroma_service:
             "carbs": 70,
             "fat": 20,
             "ingredients": [
-                {{"name": "ingredient name", "quantity": "amount", "unit": "unit"}}
+                {"name": "ingredient name", "quantity": "amount", "unit": "unit"}
             ],
             "instructions": "Step-by-step instructions in markdown",
             "image_url": "https://via.placeholder.com/400x300?text=Recipe+Image"
-        }},
-        "dinner": {{
+        },
+        "dinner": {
             "title": "Recipe Title",
             "description": "Brief description",
             "cook_time": "X minutes", 
@@ -136,122 +162,124 @@ def generate_daily_meals_with_claude(request: DailyMealRequest, chroma_service:
             "carbs": 80,
             "fat": 25,
             "ingredients": [
-                {{"name": "ingredient name", "quantity": "amount", "unit": "unit"}}
+                {"name": "ingredient name", "quantity": "amount", "unit": "unit"}
             ],
             "instructions": "Step-by-step instructions in markdown",
             "image_url": "https://via.placeholder.com/400x300?text=Recipe+Image"
-        }}
-    }}
+        }
+    }
     
     Do not include any text before or after the JSON. Return only the JSON object.
-    """
+"""
+
+# Assistant prefill that makes Claude continue a single recipe JSON object
+SINGLE_MEAL_PREFILL = "{\n    \"title\": \""
+
+# Cosine similarity a cached prompt needs before its Claude response is reused. Only entries
+# whose hard constraints match exactly (see build_meal_cache_scope) are compared at all.
+MEAL_CACHE_MIN_SIMILARITY = 0.97
+
+class DailyMealRequest(BaseModel):
+    """Request for daily meal generation"""
+    user_id: int
+    date: str  # YYYY-MM-DD format
+    preferences: Optional[Dict[str, Any]] = None
+    avoid_ingredients: Optional[List[str]] = None
+    target_calories: Optional[float] = None
+
+class DailyMealResponse(BaseModel):
+    """Response with 3 daily recipes and optional macro validation"""
+    date: str
+    breakfast: Dict[str, Any]
+    lunch: Dict[str, Any]
+    dinner: Dict[str, Any]
+    total_calories: float
+    total_protein: float
+    total_carbs: float
+    total_fat: float
+    macro_validation: Optional[Dict[str, Any]] = None
+    message: str
+    tools_called: List[str]
+    llm_provider: str
+
+def build_daily_meals_prompt(request: DailyMealRequest, chroma_service: ChromaService, user_profile) -> Tuple[str, str, str, bool]:
+    """Build the Claude prompt for 3 daily meals; returns (prompt, cache key, cache scope, has macro targets)"""
     
-    # Call Claude Sonnet 4 API with simple prompt
-    response = anthropic_client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=4000,
-        messages=[
-            {"role": "user", "content": claude_prompt}
-        ]
-    )
+    # Get user preferences from ChromaDB and build context for Claude in one read
+    user_context = chroma_service.get_cached_user_context_bundle(request.user_id)
+    user_dislikes = user_context["dislikes"]
+    preference_context = user_context["context"]
     
-    # Parse Claude response and create recipes
-    response_text = response.content[0].text
+    # Check if user has specified macro targets
+    has_macro_targets = any([
+        user_profile.target_protein_g,
+        user_profile.target_carbs_g, 
+        user_profile.target_fat_g
+    ])
     
-    # Parse Claude response - should be clean JSON now without prefill
-    try:
-        # First try direct parsing
-        recipes_data = json.loads(response_text)
-        print("✅ Successfully parsed Claude response")
-    except json.JSONDecodeError:
-        # If that fails, try to find JSON within the response
-        import re
-        
-        # Try to extract JSON from code blocks or find JSON objects
-        json_candidates = []
-        
-        # Look for JSON between ```json and ```
-        json_blocks = re.findall(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
-        json_candidates.extend(json_blocks)
-        
-        # Look for JSON between ``` and ```
-        code_blocks = re.findall(r'```\s*(.*?)\s*```', response_text, re.DOTALL)
-        json_candidates.extend(code_blocks)
-        
-        # Look for JSON object starting with { and ending with }
-        json_objects = re.findall(r'\{.*\}', response_text, re.DOTALL)
-        json_candidates.extend(json_objects)
-        
-        # Try to parse each candidate
-        recipes_data = None
-        for candidate in json_candidates:
-            try:
-                candidate = candidate.strip()
-                if candidate.startswith('{') and candidate.endswith('}'):
-                    recipes_data = json.loads(candidate)
-                    # Validate that it has the expected structure
-                    if all(key in recipes_data for key in ['breakfast', 'lunch', 'dinner']):
-                        print("✅ Successfully extracted and parsed JSON from response")
-                        break
-                    else:
-                        recipes_data = None
-            except json.JSONDecodeError:
-                continue
-        
-        if recipes_data is None:
-            # If all else fails, create a mock response for debugging
-            print(f"Warning: Could not parse Claude response, using mock data.")
-            print(f"Response starts with: {response_text[:200]}...")
-            print(f"Response length: {len(response_text)}")
-            recipes_data = {
-                "breakfast": {
-                    "title": "Mock Breakfast",
-                    "description": "Mock breakfast recipe",
-                    "cook_time": "15 minutes",
-                    "calories": 400,
-                    "protein": 20,
-                    "carbs": 50,
-                    "fat": 15,
-                    "ingredients": [{"name": "eggs", "quantity": "2", "unit": "pieces"}],
-                    "instructions": "Mock instructions",
-                    "image_url": "https://via.placeholder.com/300x200?text=Mock+Breakfast"
-                },
-                "lunch": {
-                    "title": "Mock Lunch",
-                    "description": "Mock lunch recipe",
-                    "cook_time": "30 minutes",
-                    "calories": 600,
-                    "protein": 30,
-                    "carbs": 70,
-                    "fat": 20,
-                    "ingredients": [{"name": "rice", "quantity": "1", "unit": "cup"}],
-                    "instructions": "Mock instructions",
-                    "image_url": "https://via.placeholder.com/300x200?text=Mock+Lunch"
-                },
-                "dinner": {
-                    "title": "Mock Dinner",
-                    "description": "Mock dinner recipe",
-                    "cook_time": "45 minutes",
-                    "calories": 800,
-                    "protein": 40,
-                    "carbs": 80,
-                    "fat": 25,
-                    "ingredients": [{"name": "chicken", "quantity": "200", "unit": "g"}],
-                    "instructions": "Mock instructions",
-                    "image_url": "https://via.placeholder.com/300x200?text=Mock+Dinner"
-                }
-            }
+    # Build macro requirements (only if user specified them)
+    if has_macro_targets:
+        macro_requirements = DAILY_MACRO_REQUIREMENTS_TEMPLATE.format(
+            protein=user_profile.target_protein_g,
+            carbs=user_profile.target_carbs_g,
+            fat=user_profile.target_fat_g
+        )
+    else:
+        macro_requirements = DAILY_DEFAULT_REQUIREMENTS
+    
+    target_calories = request.target_calories or user_profile.daily_calories
+    
+    # Enhanced Claude prompt with conditional macro requirements
+    claude_prompt = DAILY_MEALS_PROMPT_TEMPLATE.format(
+        preference_context=preference_context,
+        date=request.date,
+        calories=target_calories,
+        macro_requirements=macro_requirements,
+        dislikes=user_dislikes,
+        restrictions=user_profile.dietary_restrictions,
+        likes=user_profile.likes
+    ) + DAILY_MEALS_FORMAT_INSTRUCTIONS
+    
+    cache_key = build_meal_cache_key(request.date, preference_context, target_calories, user_profile)
+    cache_scope = build_meal_cache_scope(request.date, target_calories, user_profile, user_dislikes)
+    
+    return claude_prompt, cache_key, cache_scope, has_macro_targets
+
+def generate_daily_meals_with_claude(request: DailyMealRequest, chroma_service: ChromaService, user_profile) -> Tuple[DailyMealResponse, List[str]]:
+    """Generate 3 daily meals using Claude Sonnet 4 and ChromaDB preferences"""
+    
+    tools_called = ["generate_daily_meals_with_claude"]
+    
+    claude_prompt, cache_key, cache_scope, has_macro_targets = build_daily_meals_prompt(request, chroma_service, user_profile)
+    
+    # Near-identical prompts with the same day and hard constraints reuse an earlier Claude response
+    cache_embedding = chroma_service.generate_embedding(cache_key)
+    recipes_data = chroma_service.get_cached_meal_response(cache_embedding, "daily", cache_scope, MEAL_CACHE_MIN_SIMILARITY)
+    
+    embeddings = {}
+    if recipes_data is not None:
+        tools_called.append("meal_cache")
+    else:
+        recipes_data, from_claude, embeddings = request_daily_meals_from_claude(claude_prompt, chroma_service)
+        tools_called.append("claude_api")
+        if from_claude:
+            chroma_service.cache_meal_response(cache_embedding, "daily", cache_scope, recipes_data)
+    
+    return build_daily_meals_response(request, recipes_data, chroma_service, user_profile, has_macro_targets, tools_called, embeddings)
+
+def build_daily_meals_response(request: DailyMealRequest, recipes_data: Dict[str, Any], chroma_service: ChromaService,
+                               user_profile, has_macro_targets: bool, tools_called: List[str],
+                               embeddings: Optional[Dict[str, np.ndarray]] = None) -> Tuple[DailyMealResponse, List[str]]:
+    """Embed and store the 3 generated meals and assemble the daily response"""
     
     # Generate embeddings and store in ChromaDB
-    breakfast_recipe = create_recipe_with_embedding(recipes_data["breakfast"], request.user_id, "breakfast", chroma_service)
-    lunch_recipe = create_recipe_with_embedding(recipes_data["lunch"], request.user_id, "lunch", chroma_service)
-    dinner_recipe = create_recipe_with_embedding(recipes_data["dinner"], request.user_id, "dinner", chroma_service)
+    meals = create_recipes_with_embeddings(recipes_data, request.user_id, chroma_service, embeddings)
+    breakfast_recipe = meals["breakfast"]
+    lunch_recipe = meals["lunch"]
+    dinner_recipe = meals["dinner"]
     
     # Calculate totals
-    total_calories = breakfast_recipe["calories"] + lunch_recipe["calories"] + dinner_recipe["calories"]
-    total_protein = breakfast_recipe["protein"] + lunch_recipe["protein"] + dinner_recipe["protein"]
-    total_carbs = breakfast_recipe["carbs"] + lunch_recipe["carbs"] + dinner_recipe["carbs"]
-    total_fat = breakfast_recipe["fat"] + lunch_recipe["fat"] + dinner_recipe["fat"]
+    total_calories, total_protein, total_carbs, total_fat = sum_meal_totals([breakfast_recipe, lunch_recipe, dinner_recipe])
     
     # Only validate macro targets if user specified them
     macro_validation = None
@@ -262,7 +290,7 @@ def generate_daily_meals_with_claude(request: DailyMealRequest, chroma_service:
         )
         tools_called.append("macro_validation")
     
-    tools_called.extend(["claude_api", "chroma_store", "embedding_generation"])
+    tools_called.extend(["chroma_store", "embedding_generation"])
     
     return DailyMealResponse(
         date=request.date,
@@ -280,12 +308,211 @@ def generate_daily_meals_with_claude(request: DailyMealRequest, chroma_service:
         llm_provider="claude-sonnet-4"
     ), tools_called
 
+def build_meal_cache_key(day: str, preference_context: str, target_calories, user_profile) -> str:
+    """Build the text embedded as semantic cache key.
+    
+    Hard constraints come first and free-text preferences last, since MiniLM truncates
+    at 256 word pieces; exact matching of the constraints is build_meal_cache_scope's job.
+    """
+    return (
+        f"Day: {day} | Calories: {target_calories} | Protein: {user_profile.target_protein_g} | "
+        f"Carbs: {user_profile.target_carbs_g} | Fat: {user_profile.target_fat_g}\n"
+        f"Restrictions: {canonical_constraint(user_profile.dietary_restrictions or [])}\n"
+        f"Likes: {canonical_constraint(user_profile.likes or [])}\n"
+        f"{preference_context}"
+    )
+
+def canonical_constraint(value):
+    """Order- and case-independent form of a constraint value (lists sorted, strings lowercased)"""
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, dict):
+        return {str(key): canonical_constraint(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return sorted((canonical_constraint(item) for item in value), key=lambda item: orjson.dumps(item, option=orjson.OPT_SORT_KEYS))
+    if isinstance(value, (int, float)):
+        return float(value)
+    return value
+
+def build_meal_cache_scope(day: str, target_calories, user_profile, dislikes: List[str]) -> str:
+    """Exact hash of the hard constraints a cached meal plan must share with the request.
+    
+    Similarity over the cache key decides near-duplicates; this hash keeps a plan from
+    ever being served to a request with another day, calorie/macro target, restriction or dislike.
+    """
+    constraints = canonical_constraint({
+        "day": day,
+        "calories": target_calories,
+        "protein_g": user_profile.target_protein_g,
+        "carbs_g": user_profile.target_carbs_g,
+        "fat_g": user_profile.target_fat_g,
+        "restrictions": user_profile.dietary_restrictions or [],
+        "dislikes": dislikes or []
+    })
+    return hashlib.sha256(orjson.dumps(constraints, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+class MealStreamScanner:
+    """Tracks brace depth over streamed Claude text and picks out each completed top-level meal object"""
+    
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_start = 0
+        self.object_start = 0
+        self.key = None
+    
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume a chunk of text and return the (key, object) pairs it completed"""
+        self.buffer += chunk
+        completed = []
+        
+        for index in range(self.position, len(self.buffer)):
+            char = self.buffer[index]
+            
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    # Strings directly inside the outer object are the meal keys
+                    if self.depth == 1:
+                        self.key = self.buffer[self.string_start:index]
+            elif char == '"':
+                self.in_string = True
+                self.string_start = index + 1
+            elif char == "{":
+                self.depth += 1
+                if self.depth == 2:
+                    self.object_start = index
+            elif char == "}":
+                if self.depth == 2:
+                    try:
+                        completed.append((self.key, orjson.loads(self.buffer[self.object_start:index + 1])))
+                    except orjson.JSONDecodeError:
+                        pass
+                self.depth -= 1
+        
+        self.position = len(self.buffer)
+        return completed
+
+def request_daily_meals_from_claude(claude_prompt: str, chroma_service: ChromaService) -> Tuple[Dict[str, Any], bool, Dict[str, np.ndarray]]:
+    """Call Claude for the 3 daily meals; returns the recipes, whether they came from Claude and any embeddings already computed"""
+    
+    # Stream the response so each meal is embedded while Claude is still writing the next one
+    scanner = MealStreamScanner()
+    pending_embeddings = {}
+    with anthropic_client.messages.stream(**build_daily_meals_params(claude_prompt)) as stream:
+        for text in stream.text_stream:
+            for meal_type, recipe_data in scanner.feed(text):
+                if meal_type in MEAL_TYPES and meal_type not in pending_embeddings:
+                    pending_embeddings[meal_type] = embedding_executor.submit(
+                        chroma_service.generate_embedding, build_recipe_text(recipe_data), True
+                    )
+    
+    recipes_data, from_claude = parse_daily_meals_response(scanner.buffer)
+    
+    # Embeddings of streamed meals are only valid if the final parse used Claude's recipes
+    embeddings = {}
+    if from_claude:
+        embeddings = {meal_type: future.result() for meal_type, future in pending_embeddings.items()}
+    
+    return recipes_data, from_claude, embeddings
+
+def build_daily_meals_params(claude_prompt: str) -> Dict[str, Any]:
+    """Build the Messages API parameters for a daily meals prompt"""
+    return {
+        "model": DAILY_MEALS_MODEL,
+        "max_tokens": 4000,
+        "messages": [
+            {"role": "user", "content": claude_prompt}
+        ]
+    }
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Decode the first JSON object in text, ignoring anything before or after it"""
+    start = text.find("{")
+    if start == -1:
+        return None
+    
+    try:
+        data, _ = JSON_DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None
+    
+    return data if isinstance(data, dict) else None
+
+def parse_daily_meals_response(response_text: str) -> Tuple[Dict[str, Any], bool]:
+    """Parse Claude's daily meals JSON; returns the recipes and whether parsing succeeded"""
+    
+    # Should be clean JSON without prefill; any text around the object is skipped
+    recipes_data = extract_json_object(response_text)
+    if recipes_data is not None and all(meal_type in recipes_data for meal_type in MEAL_TYPES):
+        print("✅ Successfully parsed Claude response")
+        return recipes_data, True
+    
+    # Otherwise create a mock response for debugging (never cached)
+    print(f"Warning: Could not parse Claude response, using mock data.")
+    print(f"Response starts with: {response_text[:200]}...")
+    print(f"Response length: {len(response_text)}")
+    recipes_data = {
+        "breakfast": {
+            "title": "Mock Breakfast",
+            "description": "Mock breakfast recipe",
+            "cook_time": "15 minutes",
+            "calories": 400,
+            "protein": 20,
+            "carbs": 50,
+            "fat": 15,
+            "ingredients": [{"name": "eggs", "quantity": "2", "unit": "pieces"}],
+            "instructions": "Mock instructions",
+            "image_url": "https://via.placeholder.com/300x200?text=Mock+Breakfast"
+        },
+        "lunch": {
+            "title": "Mock Lunch",
+            "description": "Mock lunch recipe",
+            "cook_time": "30 minutes",
+            "calories": 600,
+            "protein": 30,
+            "carbs": 70,
+            "fat": 20,
+            "ingredients": [{"name": "rice", "quantity": "1", "unit": "cup"}],
+            "instructions": "Mock instructions",
+            "image_url": "https://via.placeholder.com/300x200?text=Mock+Lunch"
+        },
+        "dinner": {
+            "title": "Mock Dinner",
+            "description": "Mock dinner recipe",
+            "cook_time": "45 minutes",
+            "calories": 800,
+            "protein": 40,
+            "carbs": 80,
+            "fat": 25,
+            "ingredients": [{"name": "chicken", "quantity": "200", "unit": "g"}],
+            "instructions": "Mock instructions",
+            "image_url": "https://via.placeholder.com/300x200?text=Mock+Dinner"
+        }
+    }
+    return recipes_data, False
+
+def build_recipe_text(recipe_data: Dict[str, Any]) -> str:
+    """Build the text a recipe is embedded from"""
+    # Ingredient names only, instead of the repr of the whole ingredient list
+    ingredients_text = " ".join(
+        ingredient["name"] if isinstance(ingredient, dict) else str(ingredient)
+        for ingredient in recipe_data["ingredients"]
+    )
+    return f"{recipe_data['title']} {recipe_data['description']} {ingredients_text}"
+
 def create_recipe_with_embedding(recipe_data: Dict[str, Any], user_id: int, meal_type: str, chroma_service: ChromaService) -> Dict[str, Any]:
     """Create recipe with embedding and store in ChromaDB"""
     
     # Generate embedding for recipe
-    recipe_text = f"{recipe_data['title']} {recipe_data['description']} {recipe_data['ingredients']}"
-    embedding = chroma_service.generate_embedding(recipe_text)
+    embedding = chroma_service.generate_embedding(build_recipe_text(recipe_data), persist=True)
     
     # Store in ChromaDB
     recipe_data["user_id"] = user_id
@@ -297,49 +524,66 @@ def create_recipe_with_embedding(recipe_data: Dict[str, Any], user_id: int, meal
     
     return recipe_data
 
+def create_recipes_with_embeddings(recipes_data: Dict[str, Any], user_id: int, chroma_service: ChromaService,
+                                   embeddings: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Dict[str, Any]]:
+    """Create breakfast, lunch and dinner with embeddings in one batch"""
+    
+    embeddings = dict(embeddings or {})
+    meals = [recipes_data[meal_type] for meal_type in MEAL_TYPES]
+    for recipe_data, meal_type in zip(meals, MEAL_TYPES):
+        recipe_data["user_id"] = user_id
+        recipe_data["meal_type"] = meal_type
+    
+    # Encode the recipes not embedded yet in a single batch instead of batch-size-1 passes
+    missing = [meal_type for meal_type in MEAL_TYPES if meal_type not in embeddings]
+    if missing:
+        batch = chroma_service.generate_embeddings_batch([build_recipe_text(recipes_data[meal_type]) for meal_type in missing], persist=True)
+        embeddings.update(zip(missing, batch))
+    
+    # Store them with a single ChromaDB add
+    chroma_ids = chroma_service.store_recipes_bulk(meals, [embeddings[meal_type] for meal_type in MEAL_TYPES])
+    for recipe_data, chroma_id in zip(meals, chroma_ids):
+        recipe_data["chroma_id"] = chroma_id
+    
+    return dict(zip(MEAL_TYPES, meals))
+
+def sum_meal_totals(meals: List[Dict[str, Any]]) -> List[float]:
+    """Sum calories, protein, carbs and fat over meals in one vectorized pass"""
+    values = np.array([[meal[field] for field in MEAL_TOTAL_FIELDS] for meal in meals], dtype=float)
+    return values.sum(axis=0).tolist()
+
 def validate_macro_targets(actual_protein: float, actual_carbs: float, actual_fat: float,
                           target_protein: Optional[float], target_carbs: Optional[float], target_fat: Optional[float]) -> Dict[str, Any]:
     """Validate if generated meals meet user's macro targets"""
     
-    validation = {
-        "protein": {"target": target_protein, "actual": actual_protein, "met": True},
-        "carbs": {"target": target_carbs, "actual": actual_carbs, "met": True},
-        "fat": {"target": target_fat, "actual": actual_fat, "met": True}
-    }
+    actuals = (actual_protein, actual_carbs, actual_fat)
+    targets = (target_protein, target_carbs, target_fat)
     
-    # Only validate if targets are specified
-    if target_protein:
-        validation["protein"]["met"] = abs(actual_protein - target_protein) / target_protein <= 0.1
-        validation["protein"]["percentage"] = round((actual_protein / target_protein) * 100)
-    else:
-        validation["protein"]["met"] = None
-        validation["protein"]["percentage"] = None
-        
-    if target_carbs:
-        validation["carbs"]["met"] = abs(actual_carbs - target_carbs) / target_carbs <= 0.1
-        validation["carbs"]["percentage"] = round((actual_carbs / target_carbs) * 100)
-    else:
-        validation["carbs"]["met"] = None
-        validation["carbs"]["percentage"] = None
-        
-    if target_fat:
-        validation["fat"]["met"] = abs(actual_fat - target_fat) / target_fat <= 0.1
-        validation["fat"]["percentage"] = round((actual_fat / target_fat) * 100)
-    else:
-        validation["fat"]["met"] = None
-        validation["fat"]["percentage"] = None
+    # Unset targets become NaN so all three macros are checked in one element-wise pass
+    actual = np.array(actuals, dtype=float)
+    target = np.array([value or np.nan for value in targets], dtype=float)
+    has_target = ~np.isnan(target)
+    met = np.abs(actual - target) / target <= MACRO_TOLERANCE
+    percentage = np.round(actual / target * 100)
     
-    return validation
+    # Only validate if targets are specified
+    return {
+        name: {
+            "target": targets[i],
+            "actual": actuals[i],
+            "met": bool(met[i]) if has_target[i] else None,
+            "percentage": int(percentage[i]) if has_target[i] else None
+        }
+        for i, name in enumerate(MACRO_NAMES)
+    }
 
 def generate_single_meal_with_claude(request: DailyMealRequest, meal_type: str, chroma_service: ChromaService, user_profile) -> Dict[str, Any]:
     """Generate a single meal using Claude Sonnet 4"""
     
-    # Get user preferences from ChromaDB
-    user_preferences = chroma_service.get_user_preferences(request.user_id)
-    user_dislikes = chroma_service.get_user_dislikes(request.user_id)
-    
-    # Build context for Claude
-    preference_context = chroma_service.build_preference_context(user_preferences, user_dislikes)
+    # Get user preferences from ChromaDB and build context for Claude in one read
+    user_context = chroma_service.get_cached_user_context_bundle(request.user_id)
+    user_dislikes = user_context["dislikes"]
+    preference_context = user_context["context"]
     
     # Check if user has specified macro targets
     has_macro_targets = any([
@@ -349,72 +593,48 @@ def generate_single_meal_with_claude(request: DailyMealRequest, meal_type: str,
     ])
     
     # Build macro requirements for single meal
-    macro_requirements = ""
     if has_macro_targets:
-        macro_requirements = f"""
-        Target Macros for {meal_type} (user-specified daily targets):
-        - Protein: {user_profile.target_protein_g}g per day
-        - Carbs: {user_profile.target_carbs_g}g per day  
-        - Fats: {user_profile.target_fat_g}g per day
-        
-        Requirements:
-        1. This {meal_type} should contribute appropriately to daily macro targets
-        2. Focus on nutritional balance and macro distribution
-        """
+        macro_requirements = SINGLE_MEAL_MACRO_REQUIREMENTS_TEMPLATE.format(
+            meal_type=meal_type,
+            protein=user_profile.target_protein_g,
+            carbs=user_profile.target_carbs_g,
+            fat=user_profile.target_fat_g
+        )
     else:
-        macro_requirements = f"""
-        Requirements:
-        1. This {meal_type} should be nutritionally balanced and healthy
-        2. Focus on whole foods and nutritional completeness
-        """
-    
-    # Claude prompt for single meal
-    claude_prompt = f"""
-    Generate a {meal_type} recipe for a user with these preferences:
-    
-    User Context: {preference_context}
-    Target Date: {request.date}
-    Target Calories: {request.target_calories or user_profile.daily_calories}
-    {macro_requirements}
+        macro_requirements = SINGLE_MEAL_DEFAULT_REQUIREMENTS_TEMPLATE.format(meal_type=meal_type)
     
-    Additional Requirements:
-    3. Avoid these ingredients: {user_dislikes}
-    4. Consider user's dietary restrictions: {user_profile.dietary_restrictions}
-    5. Incorporate user's flavor preferences: {user_profile.likes}
-    6. Generate structured recipe with exact ingredients and quantities
-    7. Include cooking instructions in markdown format
-    8. Generate an AI image for the recipe
+    target_calories = request.target_calories or user_profile.daily_calories
     
-    Return JSON format with the {meal_type} recipe.
-    Include detailed macro breakdown per serving.
-    """
+    # Claude prompt for single meal
+    claude_prompt = SINGLE_MEAL_PROMPT_TEMPLATE.format(
+        meal_type=meal_type,
+        preference_context=preference_context,
+        date=request.date,
+        calories=target_calories,
+        macro_requirements=macro_requirements,
+        dislikes=user_dislikes,
+        restrictions=user_profile.dietary_restrictions,
+        likes=user_profile.likes
+    )
     
+    # Regenerating asks for a different meal, so this path always calls Claude (no meal cache).
     # Call Claude Sonnet 4 API with prefill technique for consistent JSON
     response = anthropic_client.messages.create(
         model="claude-3-5-sonnet-20241022",
         max_tokens=2000,
         messages=[
             {"role": "user", "content": claude_prompt},
-            {"role": "assistant", "content": "{\n    \"title\": \""}
+            {"role": "assistant", "content": SINGLE_MEAL_PREFILL}
         ]
     )
     
-    # Parse Claude response and create recipe
-    response_text = response.content[0].text
+    # Parse Claude response; the prefill is the start of the recipe object
+    response_text = SINGLE_MEAL_PREFILL + response.content[0].text
     
-    # Try to extract JSON from the response (handle cases where Claude adds extra text)
-    try:
-        # First try direct parsing
-        recipe_data = json.loads(response_text)
-    except json.JSONDecodeError:
-        # If that fails, try to find JSON within the response
-        import re
-        # Look for JSON object starting with { and ending with }
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            recipe_data = json.loads(json_match.group())
-        else:
-            raise ValueError(f"Could not extract valid JSON from Claude response: {response_text[:200]}...")
+    # Extract the JSON object (handle cases where Claude adds extra text)
+    recipe_data = extract_json_object(response_text)
+    if recipe_data is None:
+        raise ValueError(f"Could not extract valid JSON from Claude response: {response_text[:200]}...")
     
     # Generate embedding and store in ChromaDB
     recipe = create_recipe_with_embedding(recipe_data, request.user_id, meal_type, chroma_service)
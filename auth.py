@@ -4,12 +4,18 @@ JWT token-based authentication for mobile app
 """
 
 import os
+import time
+import hashlib
+import threading
+from copy import deepcopy
 from datetime import datetime, timedelta
 from typing import Optional
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from database import get_db, get_user_by_email, User
 
 # JWT Configuration
@@ -19,6 +25,14 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
 security = HTTPBearer()
 
+# Short-lived per-process caches of decoded tokens and their users (AUTH_CACHE_ENABLED=false disables)
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "true").lower() != "false"
+AUTH_CACHE_SIZE = 10000
+AUTH_CACHE_TTL_SECONDS = 30
+token_payload_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+auth_cache_lock = threading.Lock()
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -33,8 +47,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def token_cache_key(token: str) -> str:
+    """Cache key for a token, so raw tokens are not kept in memory"""
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
 def verify_token(token: str) -> dict:
-    """Verify JWT token and return payload"""
+    """Verify JWT token and return payload, reusing a recent decode of the same token"""
+    if not AUTH_CACHE_ENABLED:
+        return decode_token(token)
+    
+    key = token_cache_key(token)
+    with auth_cache_lock:
+        payload = token_payload_cache.get(key)
+    
+    # Expired tokens fall through to a full decode, which rejects them
+    if payload is None or payload.get("exp", 0) <= time.time():
+        payload = decode_token(token)
+        with auth_cache_lock:
+            token_payload_cache[key] = payload
+    return payload
+
+
+def decode_token(token: str) -> dict:
+    """Decode and verify a JWT token"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
@@ -46,7 +82,7 @@ def verify_token(token: str) -> dict:
         )
 
 
-async def get_current_user(
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
@@ -64,7 +100,7 @@ async def get_current_user(
             detail="Invalid authentication credentials"
         )
     
-    user = get_user_by_email(db, email=email)
+    user = get_cached_user_by_email(db, email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -80,6 +116,51 @@ async def get_current_user(
     return user
 
 
+def get_cached_user_by_email(db: Session, email: str) -> Optional[User]:
+    """Get user by email, from the user cache when possible (merged into db without a query)"""
+    if not AUTH_CACHE_ENABLED:
+        return get_user_by_email(db, email=email)
+    
+    with auth_cache_lock:
+        cached_user = user_cache.get(email)
+    if cached_user is not None:
+        return db.merge(cached_user, load=False)
+    
+    user = get_user_by_email(db, email=email)
+    if user is not None:
+        with auth_cache_lock:
+            user_cache[email] = detached_user_snapshot(user)
+    return user
+
+
+def column_copy(instance):
+    """Copy an instance's column values into a new transient instance"""
+    mapper = inspect(instance).mapper
+    return mapper.class_(**{attr.key: deepcopy(getattr(instance, attr.key)) for attr in mapper.column_attrs})
+
+
+def detached_user_snapshot(user: User) -> User:
+    """Snapshot a user and its profile for the user cache.
+    
+    The cached object is shared by concurrent requests, so it must never belong to
+    (or be modified through) any one session; each request merges it into its own.
+    """
+    snapshot = column_copy(user)
+    snapshot.profile = column_copy(user.profile) if user.profile is not None else None
+    
+    # Detached with their identity keys and no pending changes, so merge(load=False) accepts them
+    if snapshot.profile is not None:
+        make_transient_to_detached(snapshot.profile)
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def forget_cached_user(email: str):
+    """Drop a user from the auth cache after their account or profile changes"""
+    with auth_cache_lock:
+        user_cache.pop(email, None)
+
+
 # Optional: Role-based access control
 def require_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Require an active user"""
@@ -7,10 +7,21 @@ import os
 import chromadb
 from chromadb.config import Settings
 from typing import List, Dict, Any, Optional
-import json
 import uuid
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+import numpy as np
 from datetime import datetime
+from functools import lru_cache
+import torch
+from cachetools import LRUCache, TTLCache
 from sentence_transformers import SentenceTransformer
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import SessionLocal, get_cached_embeddings, save_cached_embeddings
 
 # Disable ChromaDB telemetry completely
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
@@ -20,17 +31,151 @@ os.environ["CHROMA_SERVER_NOFILE"] = "1"
 # Suppress ChromaDB telemetry errors
 import logging
 logging.getLogger("chromadb.telemetry.product.posthog").setLevel(logging.CRITICAL)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Preferences change on the order of minutes, so per-user context is reused briefly
+USER_CONTEXT_CACHE_SIZE = 10000
+USER_CONTEXT_CACHE_TTL_SECONDS = 60
+
+# Mirrored preference rows are bounded and re-read from ChromaDB after this long
+PREFERENCE_MIRROR_SIZE = 10000
+PREFERENCE_MIRROR_TTL_SECONDS = 60
+
+# Cached Claude meal responses are served for a day, then filtered out and evicted
+MEAL_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Embeddings are a pure function of the text, so regenerated recipes and repeated prompts reuse them
+EMBEDDING_CACHE_SIZE = 4096
+
+# Rows kept in the persisted embedding_cache table; the oldest are evicted past this
+EMBEDDING_CACHE_MAX_ROWS = 100000
+
+def use_reduced_precision() -> bool:
+    """Whether the embedder runs in FP16/INT8 (EMBEDDING_REDUCED_PRECISION, default false).
+    
+    Opt-in: quantized vectors have not been checked against the FP32 ones already stored in
+    ChromaDB, and the meal cache compares them against a 0.97 similarity threshold.
+    """
+    return os.getenv("EMBEDDING_REDUCED_PRECISION", "false").lower() == "true"
+
+def embedding_model_id() -> str:
+    """Identify the vectors the embedder produces; precision changes them, so it is part of the id"""
+    return f"{EMBEDDING_MODEL_NAME}:{'reduced' if use_reduced_precision() else 'fp32'}"
+
+def embedding_cache_key(text: str) -> bytes:
+    """Fixed-size cache key for arbitrarily long embedding input, scoped to the current model"""
+    return hashlib.sha256(f"{embedding_model_id()}:{text}".encode()).digest()
+
+def to_chroma_embeddings(embeddings) -> List[List[float]]:
+    """Convert embedding arrays to the nested lists ChromaDB accepts, at the storage boundary"""
+    return np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1).tolist()
+
+@lru_cache(maxsize=1)
+def _get_embedder() -> SentenceTransformer:
+    """Load the embedding model once per process and warm it up"""
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    
+    # Reduced precision: FP16 on GPU, dynamic INT8 for the Linear layers on CPU.
+    # Off unless EMBEDDING_REDUCED_PRECISION=true.
+    if use_reduced_precision():
+        if model.device.type == "cuda":
+            model.half()
+        else:
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    
+    # First encode pays the one-off graph/kernel setup, so do it before a real request does
+    model.encode(["warmup"])
+    
+    return model
+
+class PreferenceStore:
+    """In-process mirror of the preference collection keyed by user.
+    
+    Preference reads are always "all rows for this user", which ChromaDB answers
+    with a metadata scan over its sqlite segment. Serving them from memory skips
+    that round-trip; ChromaDB stays the store of record. Entries expire after
+    PREFERENCE_MIRROR_TTL_SECONDS and are dropped on write, so writes made by
+    another process are picked up within that window. Disabled, every read goes
+    to ChromaDB.
+    """
+    
+    def __init__(self, collection, enabled: bool = True):
+        self.collection = collection
+        self.enabled = enabled
+        self.rows = TTLCache(maxsize=PREFERENCE_MIRROR_SIZE, ttl=PREFERENCE_MIRROR_TTL_SECONDS)
+        self.lock = threading.Lock()
+        # Bumped on every write so a read that raced one does not mirror what it loaded
+        self.writes = 0
+    
+    def add(self, user_id: int, pref_id: str, embedding: np.ndarray, document: str, metadata: Dict[str, Any]):
+        """Write a preference to ChromaDB and drop the user's mirrored rows"""
+        self.add_many(user_id, [pref_id], [embedding], [document], [metadata])
+    
+    def add_many(self, user_id: int, pref_ids: List[str], embeddings, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Write several preferences for one user with a single ChromaDB add"""
+        self.collection.add(ids=pref_ids, embeddings=to_chroma_embeddings(embeddings), documents=documents, metadatas=metadatas)
+        
+        # The next read reloads the user from ChromaDB, new rows included
+        with self.lock:
+            self.writes += 1
+            self.rows.pop(user_id, None)
+    
+    def get(self, user_id: int, limit: int) -> Dict[str, Any]:
+        """Get up to limit rows for a user in ChromaDB .get result format"""
+        with self.lock:
+            user_rows = self.rows.get(user_id) if self.enabled else None
+            writes = self.writes
+        
+        if user_rows is None:
+            results = self.collection.get(where={"user_id": user_id})
+            user_rows = {
+                "ids": list(results["ids"]),
+                "documents": list(results["documents"] or []),
+                "metadatas": list(results["metadatas"] or [])
+            }
+            if self.enabled:
+                with self.lock:
+                    if self.writes == writes:
+                        self.rows[user_id] = user_rows
+        
+        return {key: values[:limit] for key, values in user_rows.items()}
 
 class ChromaService:
-    def __init__(self):
-        self.client = chromadb.Client(Settings(
-            persist_directory="./chroma_db",
+    # One service (client, collections, caches) per process
+    _instance = None
+    _instance_lock = threading.Lock()
+    
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._init()
+                cls._instance = instance
+        return cls._instance
+    
+    def _init(self):
+        settings = Settings(
             anonymized_telemetry=False,
             allow_reset=True
-        ))
+        )
         
-        # Initialize embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # A Chroma server (`chroma run`) takes index writes out of this process and lets every
+        # worker share one store. Otherwise persist to disk only when a directory is configured,
+        # and stay fully in memory by default (the previous Settings-based client never set
+        # is_persistent, so it was in-memory too)
+        chroma_host = os.getenv("CHROMA_HOST")
+        persist_directory = os.getenv("CHROMA_PERSIST_DIRECTORY")
+        if chroma_host:
+            self.client = chromadb.HttpClient(host=chroma_host, port=os.getenv("CHROMA_PORT", "8001"), settings=settings)
+        elif persist_directory:
+            self.client = chromadb.PersistentClient(path=persist_directory, settings=settings)
+        else:
+            self.client = chromadb.EphemeralClient(settings=settings)
+        
+        # Shared embedding model (loaded once per process)
+        self.embedding_model = _get_embedder()
         
         # Collections for different data types
         self.recipe_collection = self.client.get_or_create_collection(
@@ -42,77 +187,173 @@ class ChromaService:
             name="user_preferences",
             metadata={"description": "User preference embeddings"}
         )
+        # Other workers (or a shared Chroma server) write preferences this process never sees,
+        # so the in-process mirror is only used by a single worker with its own store
+        mirror_preferences = not chroma_host and int(os.getenv("WEB_CONCURRENCY", 1)) == 1
+        self.preference_store = PreferenceStore(self.preference_collection, enabled=mirror_preferences)
         
         self.user_context_collection = self.client.get_or_create_collection(
             name="user_context",
             metadata={"description": "User dietary context and history"}
         )
+        
+        self.meal_cache_collection = self.client.get_or_create_collection(
+            name="meal_cache",
+            metadata={"description": "Claude meal responses keyed by prompt embedding", "hnsw:space": "cosine"}
+        )
+        
+        # user_id -> context bundle; invalidated when the user stores a preference
+        self.user_context_cache = TTLCache(maxsize=USER_CONTEXT_CACHE_SIZE, ttl=USER_CONTEXT_CACHE_TTL_SECONDS)
+        self.user_context_cache_lock = threading.Lock()
+        
+        # sha256(model:text) -> read-only embedding. Reusable texts (persist=True) are also kept in
+        # the embedding_cache table so they survive restarts; it is written by one background thread
+        # so misses do not pay for a SQLite transaction. EMBEDDING_CACHE_PERSIST=false keeps it in memory only.
+        self.embedding_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+        self.embedding_cache_lock = threading.Lock()
+        self.persist_embeddings = os.getenv("EMBEDDING_CACHE_PERSIST", "true").lower() == "true"
+        self.embedding_cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache-writer")
+    
+    def generate_embedding(self, text: str, persist: bool = False) -> np.ndarray:
+        """Generate embedding for text, reusing the cached vector for text seen before"""
+        return self.lookup_embeddings([text], persist)[0]
+    
+    def generate_embeddings_batch(self, texts: List[str], persist: bool = False) -> np.ndarray:
+        """Generate embeddings for several texts in one forward pass, as an (N, dim) array"""
+        if not texts:
+            return np.empty((0, self.embedding_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.stack(self.lookup_embeddings(texts, persist))
     
-    def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text"""
-        return self.embedding_model.encode(text).tolist()
+    def lookup_embeddings(self, texts: List[str], persist: bool = False) -> List[np.ndarray]:
+        """Resolve embeddings from memory, then the persisted cache, then one batched model call.
+        
+        Only texts worth keeping across restarts (ingredient names, recipe texts) pass persist=True;
+        one-off strings such as meal cache keys stay in the in-memory LRU.
+        """
+        persist = persist and self.persist_embeddings
+        keys = [embedding_cache_key(text) for text in texts]
+        with self.embedding_cache_lock:
+            embeddings = [self.embedding_cache.get(key) for key in keys]
+        
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing and persist:
+            persisted = self.load_persisted_embeddings([keys[i] for i in missing])
+            for i in missing:
+                if keys[i] in persisted:
+                    # frombuffer arrays are read-only already
+                    embeddings[i] = np.frombuffer(persisted[keys[i]], dtype=np.float32)
+            missing = [i for i in missing if embeddings[i] is None]
+        
+        # Only texts not seen before go through the model, still as a single batch
+        if missing:
+            encoded = self.embedding_model.encode([texts[i] for i in missing], batch_size=32, convert_to_numpy=True)
+            for i, embedding in zip(missing, encoded):
+                # Shared between callers, so guard against in-place edits
+                embedding = np.array(embedding, dtype=np.float32)
+                embedding.flags.writeable = False
+                embeddings[i] = embedding
+            if persist:
+                self.embedding_cache_writer.submit(self.save_persisted_embeddings, {keys[i]: embeddings[i].tobytes() for i in missing})
+        
+        with self.embedding_cache_lock:
+            for key, embedding in zip(keys, embeddings):
+                self.embedding_cache[key] = embedding
+        
+        return embeddings
     
-    def store_recipe(self, recipe_data: Dict[str, Any], embedding: List[float]) -> str:
+    def load_persisted_embeddings(self, keys: List[bytes]) -> Dict[bytes, bytes]:
+        """Read persisted embeddings; the cache is best-effort, so database errors count as misses"""
+        try:
+            with SessionLocal() as db:
+                return get_cached_embeddings(db, embedding_model_id(), keys)
+        except SQLAlchemyError as e:
+            logger.warning("Embedding cache read failed: %s", e)
+            return {}
+    
+    def save_persisted_embeddings(self, vectors: Dict[bytes, bytes]):
+        """Persist new embeddings; a failed write only costs a future recompute"""
+        try:
+            with SessionLocal() as db:
+                save_cached_embeddings(db, embedding_model_id(), vectors, EMBEDDING_CACHE_MAX_ROWS)
+        except SQLAlchemyError as e:
+            logger.warning("Embedding cache write failed: %s", e)
+    
+    def store_recipe(self, recipe_data: Dict[str, Any], embedding: np.ndarray) -> str:
         """Store recipe in ChromaDB with embedding"""
-        recipe_id = str(uuid.uuid4())
+        return self.store_recipes_bulk([recipe_data], [embedding])[0]
+    
+    def store_recipes_bulk(self, recipes: List[Dict[str, Any]], embeddings) -> List[str]:
+        """Store several recipes in ChromaDB with a single add"""
+        recipe_ids = [str(uuid.uuid4()) for _ in recipes]
+        created_at = datetime.utcnow().isoformat()
         
         self.recipe_collection.add(
-            ids=[recipe_id],
-            embeddings=[embedding],
-            documents=[json.dumps(recipe_data)],
+            ids=recipe_ids,
+            embeddings=to_chroma_embeddings(embeddings),
+            documents=[orjson.dumps(recipe_data).decode() for recipe_data in recipes],
             metadatas=[{
                 "user_id": recipe_data["user_id"],
                 "meal_type": recipe_data["meal_type"],
                 "cuisine": recipe_data.get("cuisine", ""),
                 "calories": recipe_data.get("calories", 0),
-                "created_at": datetime.utcnow().isoformat()
-            }]
+                "created_at": created_at
+            } for recipe_data in recipes]
         )
         
-        return recipe_id
+        return recipe_ids
     
-    def store_user_preference(self, user_id: int, preference_data: Dict[str, Any], embedding: List[float]) -> str:
+    def store_user_preference(self, user_id: int, preference_data: Dict[str, Any], embedding: np.ndarray) -> str:
         """Store user preference in ChromaDB"""
-        pref_id = str(uuid.uuid4())
+        return self.store_user_preferences_bulk(user_id, [preference_data], [embedding])[0]
+    
+    def store_user_preferences_bulk(self, user_id: int, preferences: List[Dict[str, Any]], embeddings) -> List[str]:
+        """Store several preferences for one user in ChromaDB with a single add"""
+        pref_ids = [str(uuid.uuid4()) for _ in preferences]
+        created_at = datetime.utcnow().isoformat()
         
-        self.preference_collection.add(
-            ids=[pref_id],
-            embeddings=[embedding],
-            documents=[json.dumps(preference_data)],
-            metadatas=[{
+        self.preference_store.add_many(
+            user_id,
+            pref_ids,
+            embeddings,
+            [orjson.dumps(preference_data).decode() for preference_data in preferences],
+            [{
                 "user_id": user_id,
                 "preference_type": preference_data["preference_type"],
                 "item_type": preference_data["item_type"],
                 "strength": preference_data.get("strength", 1.0),
-                "created_at": datetime.utcnow().isoformat()
-            }]
+                "created_at": created_at
+            } for preference_data in preferences]
         )
         
-        return pref_id
+        with self.user_context_cache_lock:
+            self.user_context_cache.pop(user_id, None)
+        
+        return pref_ids
     
-    def get_user_preferences(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get user's preference history"""
-        results = self.preference_collection.get(
-            where={"user_id": user_id},
-            limit=limit
-        )
+    def fetch_user_rows(self, user_id: int, limit: int = 100) -> Dict[str, Any]:
+        """Get a user's raw preference rows (served from the in-process mirror)"""
+        return self.preference_store.get(user_id, limit)
+    
+    def get_user_preferences(self, user_id: int, limit: int = 50, rows: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Get user's preference history, optionally from rows already fetched"""
+        results = rows if rows is not None else self.fetch_user_rows(user_id, limit)
         
         preferences = []
         if results["documents"]:
-            for i, doc in enumerate(results["documents"]):
+            for i, doc in enumerate(results["documents"][:limit]):
                 preferences.append({
                     "id": results["ids"][i],
-                    "data": json.loads(doc),
+                    "data": orjson.loads(doc),
                     "metadata": results["metadatas"][i]
                 })
         
         return preferences
     
-    def find_similar_recipes(self, user_id: int, query_embedding: List[float], 
+    def find_similar_recipes(self, user_id: int, query_embedding: np.ndarray, 
                            meal_type: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Find recipes similar to user preferences"""
         results = self.recipe_collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=to_chroma_embeddings([query_embedding]),
             where={"user_id": user_id, "meal_type": meal_type},
             n_results=limit
         )
@@ -121,46 +362,134 @@ class ChromaService:
         for i, doc in enumerate(results["documents"][0]):
             recipes.append({
                 "id": results["ids"][0][i],
-                "data": json.loads(doc),
+                "data": orjson.loads(doc),
                 "metadata": results["metadatas"][0][i],
                 "similarity": results["distances"][0][i]
             })
         
         return recipes
     
-    def get_user_dislikes(self, user_id: int) -> List[str]:
-        """Get list of items user dislikes"""
-        # Get all preferences for user, then filter for dislikes
-        results = self.preference_collection.get(
-            where={"user_id": user_id},
-            limit=100
+    def get_cached_meal_response(self, prompt_embedding: np.ndarray, cache_kind: str, cache_scope: str,
+                                 min_similarity: float) -> Optional[Dict[str, Any]]:
+        """Get an unexpired cached Claude response for a sufficiently similar prompt with exactly the same scope"""
+        if self.meal_cache_collection.count() == 0:
+            return None
+        
+        results = self.meal_cache_collection.query(
+            query_embeddings=to_chroma_embeddings([prompt_embedding]),
+            where={"$and": [
+                {"cache_kind": cache_kind},
+                {"cache_scope": cache_scope},
+                {"created_ts": {"$gte": time.time() - MEAL_CACHE_TTL_SECONDS}}
+            ]},
+            n_results=1
         )
         
-        dislikes = []
-        if results["documents"]:
-            for i, doc in enumerate(results["documents"]):
-                data = json.loads(doc)
-                if data.get("preference_type") == "disliked":
-                    dislikes.append(data["item_name"])
+        if not results["ids"][0]:
+            return None
         
-        return dislikes
+        # Cosine distance, so similarity is 1 - distance
+        if 1 - results["distances"][0][0] < min_similarity:
+            return None
+        
+        return orjson.loads(results["documents"][0][0])
     
-    def build_preference_context(self, preferences: List[Dict[str, Any]], dislikes: List[str]) -> str:
-        """Build context string from user preferences"""
-        context_parts = []
+    def cache_meal_response(self, prompt_embedding: np.ndarray, cache_kind: str, cache_scope: str,
+                            response_data: Dict[str, Any]) -> str:
+        """Cache a Claude response under its prompt embedding, evicting expired entries"""
+        cache_id = str(uuid.uuid4())
+        now = time.time()
         
-        # Add liked items
-        liked_items = [p["data"]["item_name"] for p in preferences if p["data"]["preference_type"] == "liked"]
-        if liked_items:
-            context_parts.append(f"Likes: {', '.join(liked_items)}")
+        self.meal_cache_collection.delete(where={"created_ts": {"$lt": now - MEAL_CACHE_TTL_SECONDS}})
+        self.meal_cache_collection.add(
+            ids=[cache_id],
+            embeddings=to_chroma_embeddings([prompt_embedding]),
+            documents=[orjson.dumps(response_data).decode()],
+            metadatas=[{
+                "cache_kind": cache_kind,
+                "cache_scope": cache_scope,
+                "created_ts": now,
+                "created_at": datetime.utcnow().isoformat()
+            }]
+        )
+        
+        return cache_id
+    
+    def get_user_dislikes(self, user_id: int, rows: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Get list of items user dislikes, optionally from rows already fetched"""
+        if rows is None:
+            rows = self.fetch_user_rows(user_id)
+        
+        # Metadata carries the preference type, so only dislikes are parsed
+        return [
+            orjson.loads(doc)["item_name"]
+            for doc, metadata in zip(rows["documents"] or [], rows["metadatas"] or [])
+            if metadata.get("preference_type") == "disliked"
+        ]
+    
+    def get_user_context_bundle(self, user_id: int, limit: int = 100) -> Dict[str, Any]:
+        """Get a user's preferences, dislikes and prompt context from a single read"""
+        results = self.fetch_user_rows(user_id, limit)
         
-        # Add disliked items
-        if dislikes:
-            context_parts.append(f"Dislikes: {', '.join(dislikes)}")
+        # Classify every row in one pass
+        preferences = []
+        liked_items = []
+        dislikes = []
+        contexts = []
+        for pref_id, doc, metadata in zip(results["ids"], results["documents"] or [], results["metadatas"] or []):
+            data = orjson.loads(doc)
+            preferences.append({"id": pref_id, "data": data, "metadata": metadata})
+            
+            preference_type = data.get("preference_type")
+            if preference_type == "liked":
+                liked_items.append(data["item_name"])
+            elif preference_type == "disliked":
+                dislikes.append(data["item_name"])
+            
+            if data.get("context"):
+                contexts.append(data["context"])
+        
+        return {
+            "preferences": preferences,
+            "dislikes": dislikes,
+            "context": format_preference_context(liked_items, dislikes, contexts)
+        }
+    
+    def get_cached_user_context_bundle(self, user_id: int) -> Dict[str, Any]:
+        """Get a user's context bundle, reusing one built in the last minute"""
+        with self.user_context_cache_lock:
+            bundle = self.user_context_cache.get(user_id)
         
-        # Add context from preferences
-        contexts = [p["data"].get("context", "") for p in preferences if p["data"].get("context")]
-        if contexts:
-            context_parts.append(f"Context: {'; '.join(contexts)}")
+        if bundle is None:
+            bundle = self.get_user_context_bundle(user_id)
+            with self.user_context_cache_lock:
+                self.user_context_cache[user_id] = bundle
         
-        return "; ".join(context_parts) if context_parts else "No specific preferences recorded"
+        return bundle
+    
+    def build_preference_context(self, preferences: List[Dict[str, Any]], dislikes: List[str]) -> str:
+        """Build context string from user preferences"""
+        liked_items = []
+        contexts = []
+        for p in preferences:
+            if p["data"].get("preference_type") == "liked":
+                liked_items.append(p["data"]["item_name"])
+            if p["data"].get("context"):
+                contexts.append(p["data"]["context"])
+        
+        return format_preference_context(liked_items, dislikes, contexts)
+
+def format_preference_context(liked_items: List[str], dislikes: List[str], contexts: List[str]) -> str:
+    """Format classified preferences into the context string passed to Claude"""
+    context_parts = []
+    
+    if liked_items:
+        context_parts.append(f"Likes: {', '.join(liked_items)}")
+    
+    if dislikes:
+        context_parts.append(f"Dislikes: {', '.join(dislikes)}")
+    
+    if contexts:
+        context_parts.append(f"Context: {'; '.join(contexts)}")
+    
+    return "; ".join(context_parts) if context_parts else "No specific preferences recorded"
@@ -4,21 +4,75 @@ Uses SQLite with SQLAlchemy ORM for user management and profiles
 """
 
 import os
+import numpy as np
 from datetime import datetime
-from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, JSON, Boolean
+from functools import lru_cache
+from typing import Callable, Dict, Optional, List, Tuple
+from sqlalchemy import Row, create_engine, delete, event, func, insert, lambda_stmt, literal_column, or_, select, update, Index, Column, Integer, String, Float, DateTime, ForeignKey, JSON, Boolean, LargeBinary
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Session
-from passlib.context import CryptContext
+from sqlalchemy.orm import sessionmaker, relationship, selectinload, deferred, Session
+from sqlalchemy.pool import QueuePool
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test_agentic_grocery.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Pooled connections are reused across requests, keeping SQLite's per-connection page cache warm.
+# Sync routes run on FastAPI's 40-thread pool, so the default pool can hand every thread a connection
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 30))
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 30},
+    poolclass=QueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=3600,
+    pool_pre_ping=True,
+    insertmanyvalues_page_size=1000,
+    query_cache_size=1200  # Room for every statement shape (lambda_stmt and loader variants) to stay compiled
+)
+# Applied to every new SQLite connection: WAL lets readers run alongside the writer and
+# synchronous=NORMAL drops the per-commit fsync of the rollback journal
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Tune a freshly opened SQLite connection"""
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+# Instances keep their loaded state across commit, so create helpers need no refresh round-trip
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
-# Password hashing - use pbkdf2_sha256 as fallback
-pwd_context = CryptContext(schemes=["pbkdf2_sha256", "bcrypt"], deprecated="auto")
+# Password hashing - Argon2id via argon2-cffi; older pbkdf2_sha256/bcrypt hashes still verify and are upgraded on login
+password_hasher = PasswordHasher(time_cost=2, memory_cost=46 * 1024, parallelism=1)
+ARGON2_HASH_PREFIX = "$argon2"
+
+# Cheap Argon2 parameters for dev/test seed data only - never for real accounts
+test_password_hasher = PasswordHasher(time_cost=1, memory_cost=8 * 1024, parallelism=1)
+
+# Legacy hashes were computed over the password truncated to bcrypt's 72-byte limit
+LEGACY_PASSWORD_BYTES = 72
+
+
+@lru_cache(maxsize=1)
+def get_legacy_pwd_context():
+    """passlib context for pre-Argon2 hashes, imported only once such a hash is seen"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["pbkdf2_sha256", "bcrypt"])
 
 
 # Models
@@ -32,11 +86,13 @@ class User(Base):
     name = Column(String, nullable=False)  # Full name
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp())
+    updated_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp(), onupdate=datetime.utcnow)
     
     # Relationships
-    profile = relationship("UserProfile", back_populates="user", uselist=False)
+    # The profile is a singleton needed on most routes, so it is joined into every user load.
+    # Collections stay lazy; routes that walk them ask for them via load_user(..., loads=...)
+    profile = relationship("UserProfile", back_populates="user", uselist=False, lazy="joined")
     recipes = relationship("Recipe", back_populates="user")
     grocery_lists = relationship("GroceryList", back_populates="user")
     meal_history = relationship("MealHistory", back_populates="user")
@@ -44,23 +100,38 @@ class User(Base):
     preferences = relationship("UserPreference", back_populates="user")
     
     def verify_password(self, password: str) -> bool:
-        """Verify password against hash (truncate to 72 bytes for bcrypt compatibility)"""
-        # bcrypt has a 72-byte limit, so truncate if necessary
+        """Verify password against hash, upgrading outdated hashes in place (caller commits)"""
+        if self.hashed_password.startswith(ARGON2_HASH_PREFIX):
+            try:
+                password_hasher.verify(self.hashed_password, password)
+            except (VerificationError, InvalidHashError):
+                return False
+            if password_hasher.check_needs_rehash(self.hashed_password):
+                self.hashed_password = password_hasher.hash(password)
+            return True
+        
+        valid = self._verify_legacy_password(password)
+        if valid:
+            self.hashed_password = password_hasher.hash(password)
+        return valid
+    
+    def _verify_legacy_password(self, password: str) -> bool:
+        """Verify against a pre-Argon2 pbkdf2_sha256/bcrypt hash"""
+        legacy_context = get_legacy_pwd_context()
+        if legacy_context.verify(password, self.hashed_password):
+            return True
+        
+        # Hashes from before Argon2 were made from the first 72 bytes only
         password_bytes = password.encode('utf-8')
-        if len(password_bytes) > 72:
-            # Truncate to 72 bytes and decode back to string
-            password = password_bytes[:72].decode('utf-8', errors='ignore')
-        return pwd_context.verify(password, self.hashed_password)
+        if len(password_bytes) <= LEGACY_PASSWORD_BYTES:
+            return False
+        legacy_password = password_bytes[:LEGACY_PASSWORD_BYTES].decode('utf-8', errors='ignore')
+        return legacy_context.verify(legacy_password, self.hashed_password)
     
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash a password (truncate to 72 bytes for bcrypt compatibility)"""
-        # bcrypt has a 72-byte limit, so truncate if necessary
-        password_bytes = password.encode('utf-8')
-        if len(password_bytes) > 72:
-            # Truncate to 72 bytes and decode back to string
-            password = password_bytes[:72].decode('utf-8', errors='ignore')
-        return pwd_context.hash(password)
+        """Hash a password with Argon2id"""
+        return password_hasher.hash(password)
 
 
 class UserProfile(Base):
@@ -93,16 +164,28 @@ class UserProfile(Base):
     target_fat_g = Column(Float)
     target_calories = Column(Float)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp())
+    updated_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp(), onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="profile")
 
 
+# A profile can only be inserted when all of these are given
+PROFILE_REQUIRED_FIELDS = frozenset(
+    column.key for column in UserProfile.__table__.columns
+    if not column.nullable and column.default is None and not column.primary_key
+)
+
+
 class Recipe(Base):
     """Recipe model for daily meal planning"""
     __tablename__ = "recipes"
+    __table_args__ = (
+        Index("ix_recipes_user_meal", "user_id", "meal_type"),
+        # Lets /stats count all and favorite recipes from the index alone
+        Index("ix_recipes_user_favorite", "user_id", "is_favorite"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -124,9 +207,9 @@ class Recipe(Base):
     calories = Column(Float)
     fiber_g = Column(Float)
     
-    # Recipe details
-    ingredients = Column(JSON)  # List of {name, quantity, unit}
-    instructions = Column(String)  # Markdown formatted instructions
+    # Recipe details (deferred: loaded only when accessed or via undefer_group("details"))
+    ingredients = deferred(Column(JSON), group="details")  # List of {name, quantity, unit}
+    instructions = deferred(Column(String), group="details")  # Markdown formatted instructions
     image_url = Column(String)
     
     # User interaction tracking
@@ -137,18 +220,42 @@ class Recipe(Base):
     
     # ChromaDB integration
     chroma_id = Column(String, unique=True)  # ChromaDB document ID
-    embedding_vector = Column(JSON)  # Store embedding for similarity search
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp())
+    updated_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp(), onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="recipes")
+    embedding = relationship("RecipeEmbedding", uselist=False, back_populates="recipe")
+
+
+class RecipeEmbedding(Base):
+    """Recipe embedding kept out of the recipes row, as packed float16 bytes"""
+    __tablename__ = "recipe_embeddings"
+    
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), primary_key=True)
+    vector = Column(LargeBinary, nullable=False)
+    
+    # Relationships
+    recipe = relationship("Recipe", back_populates="embedding")
+
+
+class EmbeddingCache(Base):
+    """Text embeddings persisted across restarts, keyed by sha256 of model id and text"""
+    __tablename__ = "embedding_cache"
+    
+    hash = Column(LargeBinary, primary_key=True)
+    model = Column(String, nullable=False)  # Model id the vector came from
+    vector = Column(LargeBinary, nullable=False)  # float32 bytes
 
 
 class DailyMealPlan(Base):
     """Daily meal plans for users"""
     __tablename__ = "daily_meal_plans"
+    __table_args__ = (
+        # Not unique: regenerating a day (or generating several weekdays at once) adds plans for the same date
+        Index("ix_daily_meal_plans_user_date", "user_id", "date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -167,8 +274,8 @@ class DailyMealPlan(Base):
     is_completed = Column(Boolean, default=False)
     completed_at = Column(DateTime, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp())
+    updated_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp(), onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="daily_plans")
@@ -179,6 +286,9 @@ class DailyMealPlan(Base):
 class UserPreference(Base):
     """User preference learning for ChromaDB"""
     __tablename__ = "user_preferences"
+    __table_args__ = (
+        Index("ix_user_pref_user_type", "user_id", "preference_type", "item_type"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -194,9 +304,10 @@ class UserPreference(Base):
     
     # ChromaDB integration
     chroma_id = Column(String, unique=True)
-    embedding_vector = Column(JSON)
+    # Stays a JSON list: existing rows hold JSON and init_db does not alter column types
+    embedding_vector = deferred(Column(JSON))
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp())
     
     # Relationships
     user = relationship("User", back_populates="preferences")
@@ -212,12 +323,12 @@ class GroceryList(Base):
     name = Column(String, nullable=False)
     store = Column(String)
     total_cost = Column(Float)
-    items = Column(JSON)  # List of {name, quantity, category, price}
+    items = deferred(Column(JSON), group="details")  # List of {name, quantity, category, price}
     
     # Status
     is_completed = Column(Boolean, default=False)
     completed_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp())
     
     # Relationships
     user = relationship("User", back_populates="grocery_lists")
@@ -226,6 +337,9 @@ class GroceryList(Base):
 class MealHistory(Base):
     """Track user's meal history for learning preferences"""
     __tablename__ = "meal_history"
+    __table_args__ = (
+        Index("ix_meal_history_user_date", "user_id", "date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -262,12 +376,29 @@ def get_db():
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips tables that already exist, so add any indexes they are missing
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("✅ Database initialized successfully!")
 
 
-def create_user(db: Session, email: str, username: str, password: str) -> User:
+@lru_cache(maxsize=None)
+def hash_password_for_tests(password: str) -> str:
+    """Hash a seed/fixture password with cheap parameters, memoized by plaintext"""
+    return test_password_hasher.hash(password)
+
+
+def create_user(
+    db: Session,
+    email: str,
+    username: str,
+    password: str,
+    hasher: Callable[[str], str] = User.hash_password
+) -> User:
     """Create a new user"""
-    hashed_password = User.hash_password(password)
+    hashed_password = hasher(password)
     db_user = User(
         email=email,
         username=username,
@@ -275,54 +406,120 @@ def create_user(db: Session, email: str, username: str, password: str) -> User:
     )
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """Get user by email"""
-    return db.query(User).filter(User.email == email).first()
+    stmt = lambda_stmt(lambda: select(User).where(User.email == email))
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def load_user(db: Session, user_id: int, loads: Tuple[str, ...] = ()) -> Optional[User]:
+    """Get user by id, loading the named collections (e.g. "recipes") in one extra query each"""
+    return db.get(User, user_id, options=[selectinload(getattr(User, name)) for name in loads])
+
+
+def get_user_by_email_or_username(db: Session, email: str, username: str) -> Optional[Row]:
+    """Get the (email, username) of a user holding either value in one lookup, preferring an email match.
+    
+    Only the two columns are selected: no entity, profile join or identity-map entry for a uniqueness check.
+    """
+    stmt = lambda_stmt(
+        lambda: select(User.email, User.username)
+        .where(or_(User.email == email, User.username == username))
+        .order_by((User.email == email).desc())
+        .limit(1)
+    )
+    return db.execute(stmt).first()
 
 
 def get_user_by_username(db: Session, username: str) -> Optional[User]:
     """Get user by username"""
-    return db.query(User).filter(User.username == username).first()
+    stmt = lambda_stmt(lambda: select(User).where(User.username == username))
+    return db.execute(stmt).scalar_one_or_none()
 
 
 def create_user_profile(db: Session, user_id: int, profile_data: dict) -> UserProfile:
-    """Create or update user profile"""
-    # Check if profile exists
-    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
-    
-    if profile:
-        # Update existing
-        for key, value in profile_data.items():
-            setattr(profile, key, value)
+    """Create or update user profile in a single statement"""
+    if PROFILE_REQUIRED_FIELDS.issubset(profile_data):
+        stmt = sqlite_insert(UserProfile).values(user_id=user_id, **profile_data)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={**{key: stmt.excluded[key] for key in profile_data}, "updated_at": func.current_timestamp()}
+        )
     else:
-        # Create new
-        profile = UserProfile(user_id=user_id, **profile_data)
-        db.add(profile)
+        # SQLite checks NOT NULL before ON CONFLICT, so partial data can only update an existing profile
+        stmt = update(UserProfile).where(UserProfile.user_id == user_id).values(**profile_data)
     
+    profile = db.execute(
+        stmt.returning(UserProfile),
+        execution_options={"populate_existing": True}
+    ).scalar_one()
     db.commit()
-    db.refresh(profile)
     return profile
 
 
+def pack_embedding(vector) -> bytes:
+    """Pack an embedding as float16 bytes for storage (2 bytes per dimension)"""
+    return np.asarray(vector, dtype=np.float16).tobytes()
+
+
+def unpack_embedding(blob: bytes) -> np.ndarray:
+    """Unpack an embedding stored with pack_embedding as float32 for similarity math"""
+    return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+
+def get_cached_embeddings(db: Session, model: str, hashes: List[bytes]) -> Dict[bytes, bytes]:
+    """Get persisted embedding bytes for the given cache hashes produced by model, in one query"""
+    rows = db.execute(
+        select(EmbeddingCache.hash, EmbeddingCache.vector)
+        .where(EmbeddingCache.hash.in_(hashes), EmbeddingCache.model == model)
+    )
+    return dict(rows.all())
+
+
+def save_cached_embeddings(db: Session, model: str, vectors: Dict[bytes, bytes], max_rows: int):
+    """Persist embedding bytes by cache hash, then drop the oldest rows beyond max_rows"""
+    db.execute(
+        sqlite_insert(EmbeddingCache).on_conflict_do_nothing(),
+        [{"hash": hash, "model": model, "vector": vector} for hash, vector in vectors.items()]
+    )
+    # SQLite hands out increasing rowids, so the lowest ones are the oldest entries
+    rowid = literal_column("rowid")
+    db.execute(
+        delete(EmbeddingCache)
+        .where(rowid <= select(func.max(rowid)).select_from(EmbeddingCache).scalar_subquery() - max_rows)
+    )
+    db.commit()
+
+
 def save_recipe(db: Session, user_id: int, recipe_data: dict) -> Recipe:
-    """Save a recipe for user"""
+    """Save a recipe for user (an "embedding_vector" goes to recipe_embeddings)"""
+    recipe_data = dict(recipe_data)
+    embedding_vector = recipe_data.pop("embedding_vector", None)
+    
     recipe = Recipe(user_id=user_id, **recipe_data)
+    if embedding_vector is not None:
+        recipe.embedding = RecipeEmbedding(vector=pack_embedding(embedding_vector))
     db.add(recipe)
     db.commit()
-    db.refresh(recipe)
     return recipe
 
 
+def bulk_save_recipes(db: Session, user_id: int, recipes: List[dict]) -> None:
+    """Save many recipes for user with one batched INSERT and a single commit"""
+    if not recipes:
+        return
+    db.execute(insert(Recipe), [{"user_id": user_id, **recipe_data} for recipe_data in recipes])
+    db.commit()
+
+
 def create_grocery_list(db: Session, user_id: int, list_data: dict) -> GroceryList:
     """Create grocery list"""
     grocery_list = GroceryList(user_id=user_id, **list_data)
     db.add(grocery_list)
     db.commit()
-    db.refresh(grocery_list)
     return grocery_list
 
 
@@ -331,7 +528,6 @@ def log_meal(db: Session, user_id: int, meal_data: dict) -> MealHistory:
     meal = MealHistory(user_id=user_id, **meal_data)
     db.add(meal)
     db.commit()
-    db.refresh(meal)
     return meal
 
 
@@ -347,24 +543,30 @@ def create_daily_meal_plan(db: Session, user_id: int, date: datetime,
     )
     db.add(meal_plan)
     db.commit()
-    db.refresh(meal_plan)
     return meal_plan
 
 
 def get_daily_meal_plan(db: Session, user_id: int, date: datetime) -> Optional[DailyMealPlan]:
     """Get daily meal plan for a specific date"""
-    return db.query(DailyMealPlan).filter(
-        DailyMealPlan.user_id == user_id,
-        DailyMealPlan.date == date
-    ).first()
+    stmt = lambda_stmt(
+        lambda: select(DailyMealPlan).where(
+            DailyMealPlan.user_id == user_id,
+            DailyMealPlan.date == date
+        )
+    )
+    return db.execute(stmt).scalars().first()
 
 
 def create_user_preference(db: Session, user_id: int, preference_data: dict) -> UserPreference:
     """Create a user preference"""
+    preference_data = dict(preference_data)
+    if preference_data.get("embedding_vector") is not None:
+        # Embeddings arrive as numpy arrays, which the JSON column cannot serialize
+        preference_data["embedding_vector"] = np.asarray(preference_data["embedding_vector"], dtype=np.float32).tolist()
+    
     preference = UserPreference(user_id=user_id, **preference_data)
     db.add(preference)
     db.commit()
-    db.refresh(preference)
     return preference
 
 
@@ -379,7 +581,8 @@ if __name__ == "__main__":
             db,
             email="test@example.com",
             username="testuser",
-            password="testpassword123"
+            password="testpassword123",
+            hasher=hash_password_for_tests
         )
         print(f"✅ Created test user: {test_user.email}")
         
@@ -5,6 +5,7 @@ Debug script to test the search_and_price_ingredient function directly
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -31,11 +32,13 @@ def debug_search_function():
             ("garam masala", 1, "tsp")
         ]
         
-        for ingredient_name, quantity, unit in test_cases:
+        # Each lookup is network-bound, so run them together and report in order
+        with ThreadPoolExecutor(max_workers=len(test_cases)) as executor:
+            results = list(executor.map(lambda case: search_and_price_ingredient(*case), test_cases))
+        
+        for (ingredient_name, quantity, unit), result in zip(test_cases, results):
             print(f"\n🧪 Testing: {ingredient_name} - {quantity} {unit}")
             
-            result = search_and_price_ingredient(ingredient_name, quantity, unit)
-            
             print(f"  Name: {result['name']}")
             print(f"  Price: ${result['price']}")
             print(f"  Source: {result['source']}")
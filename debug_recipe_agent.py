@@ -5,10 +5,21 @@ Debug Recipe Agent - Test single day generation
 
 import requests
 import json
+from requests.adapters import HTTPAdapter
+
+def create_session():
+    """Create a session that keeps connections to the API alive between calls"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
 
 def test_single_day():
     """Test generating meals for a single day"""
     base_url = "http://localhost:8000"
+    session = create_session()
     
     # First, create a user
     print("🧪 Creating test user...")
@@ -24,26 +35,25 @@ def test_single_day():
         "likes": ["spicy"]
     }
     
-    response = requests.post(f"{base_url}/auth/register", json=user_data)
+    response = session.post(f"{base_url}/auth/register", json=user_data)
     print(f"Registration status: {response.status_code}")
     
     if response.status_code not in [200, 201]:
         print(f"Registration failed: {response.text}")
+        session.close()
         return
     
     # Get auth token
     auth_token = response.json().get("access_token")
-    headers = {"Authorization": f"Bearer {auth_token}"}
+    session.headers.update({"Authorization": f"Bearer {auth_token}"})
     
     # Test the new endpoint
     print("\n🧪 Testing daily meals generation...")
-    response = requests.post(
-        f"{base_url}/daily-meals/generate-by-day?day=Monday",
-        headers=headers
-    )
+    response = session.post(f"{base_url}/daily-meals/generate-by-day?day=Monday")
     
     print(f"Status Code: {response.status_code}")
     print(f"Response: {response.text}")
+    session.close()
 
 if __name__ == "__main__":
     test_single_day()
@@ -5,7 +5,8 @@ Debug script for registration issues
 
 import sys
 import traceback
-from database import init_db, get_db, create_user, get_user_by_email, get_user_by_username, User, UserProfile
+from sqlalchemy import inspect
+from database import engine, init_db, get_db, create_user, get_user_by_email, get_user_by_username, User, UserProfile
 from auth import create_access_token
 from datetime import timedelta
 
@@ -13,8 +14,12 @@ def test_database_connection():
     """Test database connection and initialization"""
     print("🧪 Testing database connection...")
     try:
-        init_db()
-        print("✅ Database initialized successfully")
+        # Tables already exist after the first run; skip the CREATE IF NOT EXISTS round-trips
+        if inspect(engine).has_table("users"):
+            print("✅ Database already initialized")
+        else:
+            init_db()
+            print("✅ Database initialized successfully")
         return True
     except Exception as e:
         print(f"❌ Database initialization failed: {e}")
@@ -43,51 +48,52 @@ def test_user_creation():
             "password": test_password
         }
         
-        # Check if user exists
-        existing_user = get_user_by_email(db, user_data["email"])
-        if existing_user:
-            print("⚠️ User already exists, deleting...")
-            db.delete(existing_user)
-            db.commit()
-        
-        # Create user
-        user = User(
-            email=user_data["email"],
-            username=user_data["username"],
-            name=user_data["name"],
-            hashed_password=User.hash_password(user_data["password"])
-        )
-        print("✅ User object created")
-        
-        db.add(user)
-        db.flush()
-        print(f"✅ User added to database with ID: {user.id}")
-        
-        # Create profile
-        profile = UserProfile(
-            user_id=user.id,
-            daily_calories=2000.0,
-            dietary_restrictions=["vegetarian"],
-            likes=["spicy"],
-            additional_information="Test user"
-        )
-        print("✅ Profile object created")
-        
-        db.add(profile)
-        db.commit()
-        print("✅ Profile added to database")
-        
-        # Test token creation
-        token = create_access_token(
-            data={"sub": user.email},
-            expires_delta=timedelta(minutes=60)
-        )
-        print(f"✅ Token created: {token[:20]}...")
-        
-        # Clean up
-        db.delete(profile)
-        db.delete(user)
-        db.commit()
+        # Everything below runs in one transaction with a single commit
+        with db.begin():
+            # Check if user exists
+            existing_user = get_user_by_email(db, user_data["email"])
+            if existing_user:
+                print("⚠️ User already exists, deleting...")
+                db.delete(existing_user)
+                db.flush()
+            
+            # Create user
+            user = User(
+                email=user_data["email"],
+                username=user_data["username"],
+                name=user_data["name"],
+                hashed_password=hashed
+            )
+            print("✅ User object created")
+            
+            db.add(user)
+            db.flush()
+            print(f"✅ User added to database with ID: {user.id}")
+            
+            # Create profile
+            profile = UserProfile(
+                user_id=user.id,
+                daily_calories=2000.0,
+                dietary_restrictions=["vegetarian"],
+                likes=["spicy"],
+                additional_information="Test user"
+            )
+            print("✅ Profile object created")
+            
+            db.add(profile)
+            db.flush()
+            print("✅ Profile added to database")
+            
+            # Test token creation
+            token = create_access_token(
+                data={"sub": user.email},
+                expires_delta=timedelta(minutes=60)
+            )
+            print(f"✅ Token created: {token[:20]}...")
+            
+            # Clean up
+            db.delete(profile)
+            db.delete(user)
         print("✅ Test data cleaned up")
         
         return True
@@ -6,44 +6,51 @@ Includes authentication, user management, and SQLite database
 """
 
 import os
-import sys
+import asyncio
 import json
+import orjson
+import hashlib
 import warnings
 from typing import Dict, Any, Optional, List
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime, timedelta
 
 # Suppress PyTorch deprecation warnings
 warnings.filterwarnings("ignore", category=FutureWarning, module="transformers")
 warnings.filterwarnings("ignore", category=FutureWarning, module="torch")
 
-from fastapi import FastAPI, HTTPException, status, Depends
+from fastapi import FastAPI, HTTPException, Request, status, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import Session, joinedload, undefer_group
 from dotenv import load_dotenv
 
 # Import agent modules
 from agents.recipe_agent.agent import generate_recipes
-from agents.grocery_agent.agent import generate_grocery_list
+from agents.grocery_agent.agent import generate_grocery_list, get_kroger_cache_stats
 from agents.recipe_agent.daily_meals import (
     generate_daily_meals_with_claude, 
     generate_single_meal_with_claude,
-    DailyMealRequest,
-    DailyMealResponse
+    build_recipe_text,
+    DailyMealRequest
 )
 from chroma_service import ChromaService
-from utils.logger import setup_logger, log_api_call
+from utils.logger import setup_logger, log_api_call, drain_api_logs
 
 # Import database and auth
 from database import (
-    get_db, init_db, create_user, get_user_by_email, get_user_by_username,
+    engine, get_db, init_db, get_user_by_email_or_username, pack_embedding,
     create_user_profile, save_recipe as db_save_recipe,
     create_grocery_list as db_create_grocery_list, log_meal as db_log_meal,
-    create_daily_meal_plan, get_daily_meal_plan, create_user_preference,
-    User, UserProfile, Recipe, GroceryList, MealHistory, DailyMealPlan, UserPreference
+    User, UserProfile, Recipe, RecipeEmbedding, GroceryList, MealHistory, DailyMealPlan
+)
+from auth import (
+    create_access_token, get_current_user, get_cached_user_by_email, forget_cached_user,
+    ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from auth import create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
 
 # Load environment variables
 load_dotenv()
@@ -60,13 +67,24 @@ async def lifespan(app: FastAPI):
     """Manage application lifespan"""
     logger.info("🚀 Starting Agentic Grocery API...")
     
+    # A worker forked from a preloaded app (gunicorn --preload) must not share the parent's
+    # pooled connections; drop them without closing so this process opens its own
+    engine.dispose(close=False)
+    
     # Initialize database
     init_db()
     logger.info("✅ Database initialized")
     
+    # Drain log_api_call events in the background instead of printing per request
+    api_log_task = asyncio.create_task(drain_api_logs())
+    
     logger.info("✅ All agents initialized and ready")
     yield
     logger.info("👋 Shutting down Agentic Grocery API...")
+    api_log_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await api_log_task
+    engine.dispose()
 
 
 # Initialize FastAPI app
@@ -76,7 +94,8 @@ app = FastAPI(
     version="0.3.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -88,6 +107,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large recipe/grocery JSON; small bodies are not worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Routes doing synchronous DB or agent work are plain `def`: FastAPI runs them in its
+# threadpool, so a blocking Session or LLM call no longer stalls the event loop
+
 
 # Pydantic models for API requests/responses
 
@@ -219,30 +244,155 @@ class RecipeForGrocery(BaseModel):
     description: Optional[str] = Field(None, description="Recipe description")
 
 
+class SavedRecipe(BaseModel):
+    """Saved recipe row"""
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    user_id: Optional[int] = None
+    title: str
+    description: Optional[str] = None
+    meal_type: str
+    cook_time: Optional[str] = None
+    prep_time: Optional[str] = None
+    servings: Optional[int] = None
+    cuisine: Optional[str] = None
+    difficulty: Optional[str] = None
+    protein_g: Optional[float] = None
+    carbs_g: Optional[float] = None
+    fat_g: Optional[float] = None
+    calories: Optional[float] = None
+    fiber_g: Optional[float] = None
+    ingredients: Optional[Any] = None
+    instructions: Optional[str] = None
+    image_url: Optional[str] = None
+    times_generated: Optional[int] = None
+    times_selected: Optional[int] = None
+    user_rating: Optional[float] = None
+    is_favorite: Optional[bool] = None
+    chroma_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class RecipesResponse(BaseModel):
+    """Saved recipes response"""
+    recipes: List[SavedRecipe]
+
+
+class SaveRecipeResponse(BaseModel):
+    """Save recipe response"""
+    message: str
+    recipe: SavedRecipe
+
+
+class MealHistoryEntry(BaseModel):
+    """Logged meal row"""
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    user_id: Optional[int] = None
+    recipe_id: Optional[int] = None
+    date: Optional[datetime] = None
+    meal_type: Optional[str] = None
+    recipe_title: Optional[str] = None
+    protein_g: Optional[float] = None
+    carbs_g: Optional[float] = None
+    fat_g: Optional[float] = None
+    calories: Optional[float] = None
+    rating: Optional[int] = None
+    notes: Optional[str] = None
+
+
+class LogMealResponse(BaseModel):
+    """Log meal response"""
+    message: str
+    meal: MealHistoryEntry
+
+
+class MealHistoryResponse(BaseModel):
+    """Meal history response"""
+    meals: List[MealHistoryEntry]
+    days: int
+
+
+class StatsResponse(BaseModel):
+    """User statistics response"""
+    total_recipes: int
+    favorite_recipes: int
+    total_grocery_lists: int
+    total_meals_logged: int
+
+
 # API Endpoints
 
+# Static payloads are serialized once at import rather than on every request
+ROOT_INFO = {
+    "name": "Agentic Grocery API",
+    "version": "0.3.0",
+    "description": "Multi-agent system for food recommendations and grocery automation",
+    "features": ["Multi-Agent AI", "Claude Recipes", "Kroger Integration", "User Authentication"],
+    "agents": ["RecipeAgent", "GroceryAgent"],
+    "docs": "/docs",
+    "health": "/health",
+    "auth": {
+        "register": "/auth/register",
+        "login": "/auth/login"
+    }
+}
+ROOT_RESPONSE_BODY = orjson.dumps(ROOT_INFO)
+
+
+def etag_for(body: bytes) -> str:
+    """Strong ETag for a pre-serialized response body"""
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def cached_json_response(request: Request, body: bytes, etag: str, max_age: int) -> Response:
+    """Return pre-serialized JSON with cache headers, or a bare 304 if the client already has it"""
+    headers = {"Cache-Control": f"public, max-age={max_age}", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def model_json_response(model: BaseModel) -> Response:
+    """Serialize a response model straight to JSON bytes in pydantic-core, skipping jsonable_encoder"""
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
+
 @app.get("/", tags=["Root"])
 async def root():
     """Root endpoint with API information"""
+    return Response(content=ROOT_RESPONSE_BODY, media_type="application/json")
+
+
+# ==================== AUTHENTICATION ENDPOINTS ====================
+
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+ACCESS_TOKEN_EXPIRES_IN_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+
+def build_token_response(user: User, **profile_fields) -> Dict[str, Any]:
+    """Issue an access token for user and wrap it in the TokenResponse payload"""
+    access_token = create_access_token(data={"sub": user.email}, expires_delta=ACCESS_TOKEN_EXPIRES)
+    
     return {
-        "name": "Agentic Grocery API",
-        "version": "0.3.0",
-        "description": "Multi-agent system for food recommendations and grocery automation",
-        "features": ["Multi-Agent AI", "Claude Recipes", "Kroger Integration", "User Authentication"],
-        "agents": ["RecipeAgent", "GroceryAgent"],
-        "docs": "/docs",
-        "health": "/health",
-        "auth": {
-            "register": "/auth/register",
-            "login": "/auth/login"
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRES_IN_SECONDS,
+        "user": {
+            "id": user.id,
+            "email": user.email,
+            "username": user.username,
+            "name": user.name,
+            **profile_fields
         }
     }
 
 
-# ==================== AUTHENTICATION ENDPOINTS ====================
-
 @app.post("/auth/register", response_model=TokenResponse, tags=["Authentication"])
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """
     Register a new user account with detailed food preferences
     
@@ -261,25 +411,28 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     """
     log_api_call("/auth/register", "started")
     
-    # Check if user exists
-    if get_user_by_email(db, user_data.email):
+    # Check if user exists (email and username in one query)
+    existing_user = get_user_by_email_or_username(db, user_data.email, user_data.username)
+    if existing_user and existing_user.email == user_data.email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    if get_user_by_username(db, user_data.username):
+    if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
+    hashed_password = User.hash_password(user_data.password)
+    
     # Create user with name
     user = User(
         email=user_data.email,
         username=user_data.username,
         name=user_data.name,
-        hashed_password=User.hash_password(user_data.password)
+        hashed_password=hashed_password
     )
     db.add(user)
     db.flush()  # Get user ID before creating profile
@@ -299,35 +452,20 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     )
     db.add(profile)
     db.commit()
-    db.refresh(user)
-    
-    # Create access token
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
     
     log_api_call("/auth/register", "completed")
-    logger.info(f"New user registered: {user.username} ({user.name})")
+    logger.info("New user registered: %s (%s)", user.username, user.name)
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "username": user.username,
-            "name": user.name,
-            "daily_calories": user_data.daily_calories,
-            "dietary_restrictions": user_data.dietary_restrictions,
-            "likes": user_data.likes
-        }
-    }
+    return build_token_response(
+        user,
+        daily_calories=user_data.daily_calories,
+        dietary_restrictions=user_data.dietary_restrictions,
+        likes=user_data.likes
+    )
 
 
 @app.post("/auth/login", response_model=TokenResponse, tags=["Authentication"])
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+def login(credentials: UserLogin, db: Session = Depends(get_db)):
     """
     Login user and return JWT token
     
@@ -336,7 +474,7 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
     """
     log_api_call("/auth/login", "started")
     
-    user = get_user_by_email(db, credentials.email)
+    user = get_cached_user_by_email(db, credentials.email)
     
     if not user or not user.verify_password(credentials.password):
         raise HTTPException(
@@ -350,32 +488,21 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
             detail="User account is inactive"
         )
     
-    # Create access token
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    # Persist the rehashed password if verification upgraded a legacy hash
+    if db.is_modified(user):
+        db.commit()
+        forget_cached_user(user.email)
     
     log_api_call("/auth/login", "completed")
-    logger.info(f"User logged in: {user.username}")
+    logger.info("User logged in: %s", user.username)
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "username": user.username,
-            "name": user.name
-        }
-    }
+    return build_token_response(user)
 
 
 # ==================== USER PROFILE ENDPOINTS ====================
 
 @app.get("/profile", tags=["User Profile"])
-async def get_profile(
+def get_profile(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -386,20 +513,21 @@ async def get_profile(
     - Name, daily calories, dietary restrictions, likes, additional info
     - Optional macros and physical stats
     """
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
+    profile = current_user.profile
     
     profile_data = None
     if profile:
+        protein, carbs, fats = profile.target_protein_g, profile.target_carbs_g, profile.target_fat_g
         profile_data = {
             "daily_calories": profile.daily_calories,
             "dietary_restrictions": profile.dietary_restrictions,
             "likes": profile.likes,
             "additional_information": profile.additional_information,
             "macros": {
-                "protein": profile.target_protein_g,
-                "carbs": profile.target_carbs_g,
-                "fats": profile.target_fat_g
-            } if profile.target_protein_g or profile.target_carbs_g or profile.target_fat_g else None
+                "protein": protein,
+                "carbs": carbs,
+                "fats": fats
+            } if protein or carbs or fats else None
         }
     
     return {
@@ -415,7 +543,7 @@ async def get_profile(
 
 
 @app.put("/profile", tags=["User Profile"])
-async def update_profile(
+def update_profile(
     profile_data: UserProfileUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -427,7 +555,7 @@ async def update_profile(
     Only updates fields that are provided.
     """
     # Filter out None values
-    update_data = {k: v for k, v in profile_data.model_dump().items() if v is not None}
+    update_data = profile_data.model_dump(exclude_unset=True, exclude_none=True)
     
     if not update_data:
         raise HTTPException(
@@ -436,42 +564,47 @@ async def update_profile(
         )
     
     profile = create_user_profile(db, current_user.id, update_data)
+    forget_cached_user(current_user.email)
     
-    logger.info(f"Profile updated for user: {current_user.username}")
+    logger.info("Profile updated for user: %s", current_user.username)
     
     return {"message": "Profile updated successfully", "profile": profile}
 
 
+# Static health payload, with an ETag so monitors and proxies can revalidate with a 304
+HEALTH_RESPONSE_BODY = HealthResponse(
+    status="healthy",
+    message="All systems operational",
+    version="0.3.0",
+    agents={
+        "RecipeAgent": "operational",
+        "GroceryAgent": "operational"
+    }
+).model_dump_json().encode()
+HEALTH_ETAG = etag_for(HEALTH_RESPONSE_BODY)
+HEALTH_MAX_AGE_SECONDS = 5
+
+
 @app.get("/health", response_model=HealthResponse, tags=["System"])
-async def health_check():
+async def health_check(request: Request):
     """
     Health check endpoint for monitoring
     Returns status of all agents and system
     """
     log_api_call("/health", "started")
-    
-    try:
-        health_status = HealthResponse(
-            status="healthy",
-            message="All systems operational",
-            version="0.3.0",
-            agents={
-                "RecipeAgent": "operational",
-                "GroceryAgent": "operational"
-            }
-        )
-        log_api_call("/health", "completed")
-        return health_status
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Service unhealthy"
-        )
+    response = cached_json_response(request, HEALTH_RESPONSE_BODY, HEALTH_ETAG, HEALTH_MAX_AGE_SECONDS)
+    log_api_call("/health", "completed")
+    return response
+
+
+@app.get("/metrics", tags=["System"])
+async def metrics():
+    """In-process cache counters for this worker"""
+    return {"kroger_product_cache": get_kroger_cache_stats()}
 
 
 @app.post("/recipe", tags=["Agents"])
-async def recipe_endpoint(
+def recipe_endpoint(
     request: RecipeRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -493,11 +626,11 @@ async def recipe_endpoint(
         List of generated recipes with macros and instructions
     """
     log_api_call("/recipe", "started")
-    logger.info(f"Generating recipes for user: {current_user.username}")
+    logger.info("Generating recipes for user: %s", current_user.username)
     
     try:
         # Get user profile from database
-        profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
+        profile = current_user.profile
         
         # Use provided user_profile or construct from database
         if not request.user_profile and profile:
@@ -528,13 +661,14 @@ async def recipe_endpoint(
         }
         
         response = generate_recipes(recipe_request_dict)
-        
+
         log_api_call("/recipe", "completed")
-        logger.info(f"Generated {len(response.get('recipes', []))} recipes for {current_user.username}")
-        return response
+        logger.info("Generated %s recipes for %s", len(response.get('recipes', [])), current_user.username)
+        # Already JSON-ready, so skip jsonable_encoder and encode with orjson
+        return ORJSONResponse(response)
         
     except Exception as e:
-        logger.error(f"Recipe endpoint error: {e}")
+        logger.error("Recipe endpoint error: %s", e)
         log_api_call("/recipe", "failed")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -543,7 +677,7 @@ async def recipe_endpoint(
 
 
 @app.post("/grocery", tags=["Agents"])
-async def grocery_endpoint(
+def grocery_endpoint(
     request: GroceryRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -564,7 +698,7 @@ async def grocery_endpoint(
         Grocery list with items, quantities, and estimated costs
     """
     log_api_call("/grocery", "started")
-    logger.info(f"Creating grocery list for user: {current_user.username}")
+    logger.info("Creating grocery list for user: %s", current_user.username)
     
     try:
         # Generate grocery list through GroceryAgent
@@ -585,14 +719,14 @@ async def grocery_endpoint(
         })
         
         log_api_call("/grocery", "completed")
-        logger.info(f"Created and saved list with {len(response.get('items', []))} items")
+        logger.info("Created and saved list with %s items", len(response.get('items', [])))
         
         # Return response with database ID
         response["list_id"] = grocery_list.id
         return response
         
     except Exception as e:
-        logger.error(f"Grocery endpoint error: {e}")
+        logger.error("Grocery endpoint error: %s", e)
         log_api_call("/grocery", "failed")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -602,16 +736,51 @@ async def grocery_endpoint(
 
 #==================== DAILY MEAL PLANNING ENDPOINTS ====================
 
+MEAL_TYPES = ("breakfast", "lunch", "dinner")
+
+
+def recipe_row(user_id: int, meal_type: str, meal: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a generated meal onto Recipe column values, usable with insert(Recipe) or Recipe(**row)"""
+    return {
+        "user_id": user_id,
+        "title": meal["title"],
+        "description": meal["description"],
+        "meal_type": meal_type,
+        "cook_time": meal["cook_time"],
+        "prep_time": meal.get("prep_time", "15 minutes"),
+        "servings": meal.get("servings", 1),
+        "cuisine": meal.get("cuisine"),
+        "difficulty": meal.get("difficulty", "medium"),
+        "protein_g": meal["protein"],
+        "carbs_g": meal["carbs"],
+        "fat_g": meal["fat"],
+        "calories": meal["calories"],
+        "ingredients": meal["ingredients"],
+        "instructions": meal["instructions"],
+        "image_url": meal.get("image_url", ""),
+        "chroma_id": meal.get("chroma_id", "")
+    }
+
+
+def insert_meal_recipes(db: Session, user_id: int, response) -> List[int]:
+    """Insert a day's breakfast, lunch and dinner recipes in one statement and return their IDs in meal order"""
+    rows = [recipe_row(user_id, meal_type, getattr(response, meal_type)) for meal_type in MEAL_TYPES]
+    return list(db.scalars(insert(Recipe).returning(Recipe.id, sort_by_parameter_order=True), rows))
+
+
 @app.post("/daily-meals/generate", tags=["Daily Meals"])
-async def generate_daily_meals(
+def generate_daily_meals(
     day: str,  # Day name: Monday, Tuesday, Wednesday, Thursday, Friday, Saturday, Sunday
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Generate 3 daily meals (breakfast, lunch, dinner) with macro targets"""
     
+    # Plan date taken at request start, so a slow Claude call can't push it past midnight
+    today = datetime.now().date()
+    
     # Get user profile with macro targets
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
+    profile = current_user.profile
     
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
@@ -625,92 +794,34 @@ async def generate_daily_meals(
     
     response, tools_called = generate_daily_meals_with_claude(request, chroma_service, profile)
     
-    # Save recipes to database
-    breakfast_recipe = Recipe(
-        user_id=current_user.id,
-        title=response.breakfast["title"],
-        description=response.breakfast["description"],
-        meal_type="breakfast",
-        cook_time=response.breakfast["cook_time"],
-        prep_time=response.breakfast.get("prep_time", "15 minutes"),
-        servings=response.breakfast.get("servings", 1),
-        cuisine=response.breakfast.get("cuisine"),
-        difficulty=response.breakfast.get("difficulty", "medium"),
-        protein_g=response.breakfast["protein"],
-        carbs_g=response.breakfast["carbs"],
-        fat_g=response.breakfast["fat"],
-        calories=response.breakfast["calories"],
-        ingredients=response.breakfast["ingredients"],
-        instructions=response.breakfast["instructions"],
-        image_url=response.breakfast.get("image_url", ""),
-        chroma_id=response.breakfast.get("chroma_id", "")
-    )
-    
-    lunch_recipe = Recipe(
-        user_id=current_user.id,
-        title=response.lunch["title"],
-        description=response.lunch["description"],
-        meal_type="lunch",
-        cook_time=response.lunch["cook_time"],
-        prep_time=response.lunch.get("prep_time", "15 minutes"),
-        servings=response.lunch.get("servings", 1),
-        cuisine=response.lunch.get("cuisine"),
-        difficulty=response.lunch.get("difficulty", "medium"),
-        protein_g=response.lunch["protein"],
-        carbs_g=response.lunch["carbs"],
-        fat_g=response.lunch["fat"],
-        calories=response.lunch["calories"],
-        ingredients=response.lunch["ingredients"],
-        instructions=response.lunch["instructions"],
-        image_url=response.lunch.get("image_url", ""),
-        chroma_id=response.lunch.get("chroma_id", "")
-    )
-    
-    dinner_recipe = Recipe(
-        user_id=current_user.id,
-        title=response.dinner["title"],
-        description=response.dinner["description"],
-        meal_type="dinner",
-        cook_time=response.dinner["cook_time"],
-        prep_time=response.dinner.get("prep_time", "15 minutes"),
-        servings=response.dinner.get("servings", 1),
-        cuisine=response.dinner.get("cuisine"),
-        difficulty=response.dinner.get("difficulty", "medium"),
-        protein_g=response.dinner["protein"],
-        carbs_g=response.dinner["carbs"],
-        fat_g=response.dinner["fat"],
-        calories=response.dinner["calories"],
-        ingredients=response.dinner["ingredients"],
-        instructions=response.dinner["instructions"],
-        image_url=response.dinner.get("image_url", ""),
-        chroma_id=response.dinner.get("chroma_id", "")
-    )
-    
-    db.add_all([breakfast_recipe, lunch_recipe, dinner_recipe])
-    db.flush()  # Get IDs
+    # Save the three recipes with one executemany INSERT ... RETURNING
+    breakfast_id, lunch_id, dinner_id = insert_meal_recipes(db, current_user.id, response)
     
     # Save meal plan (use current date since we're working with day names)
     meal_plan = DailyMealPlan(
         user_id=current_user.id,
-        date=datetime.now().date(),
-        breakfast_recipe_id=breakfast_recipe.id,
-        lunch_recipe_id=lunch_recipe.id,
-        dinner_recipe_id=dinner_recipe.id
+        date=today,
+        breakfast_recipe_id=breakfast_id,
+        lunch_recipe_id=lunch_id,
+        dinner_recipe_id=dinner_id
     )
     db.add(meal_plan)
     db.commit()
     
-    return response
+    return model_json_response(response)
 
 
 @app.post("/daily-meals/generate-by-day", tags=["Daily Meals"])
-async def generate_daily_meals_by_day(
+def generate_daily_meals_by_day(
     day: str,  # Day name: Monday, Tuesday, Wednesday, Thursday, Friday, Saturday, Sunday
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Generate 3 daily meals for a specific day of the week"""
     
+    # Plan date taken at request start, so a slow Claude call can't push it past midnight
+    today = datetime.now().date()
+    
     # Validate day name
     valid_days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
     if day not in valid_days:
@@ -720,7 +831,7 @@ async def generate_daily_meals_by_day(
         )
     
     # Get user profile with macro targets
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
+    profile = current_user.profile
     
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
@@ -735,113 +846,59 @@ async def generate_daily_meals_by_day(
     response, tools_called = generate_daily_meals_with_claude(request, chroma_service, profile)
     
     # Save recipes to database
-    breakfast_recipe = Recipe(
-        user_id=current_user.id,
-        title=response.breakfast["title"],
-        description=response.breakfast["description"],
-        meal_type="breakfast",
-        cook_time=response.breakfast["cook_time"],
-        prep_time=response.breakfast.get("prep_time", "15 minutes"),
-        servings=response.breakfast.get("servings", 1),
-        cuisine=response.breakfast.get("cuisine"),
-        difficulty=response.breakfast.get("difficulty", "medium"),
-        calories=response.breakfast["calories"],
-        protein_g=response.breakfast["protein"],
-        carbs_g=response.breakfast["carbs"],
-        fat_g=response.breakfast["fat"],
-        ingredients=json.dumps(response.breakfast["ingredients"]),
-        instructions=response.breakfast["instructions"],
-        image_url=response.breakfast.get("image_url", ""),
-        chroma_id=response.breakfast.get("chroma_id", "")
-    )
-    
-    lunch_recipe = Recipe(
-        user_id=current_user.id,
-        title=response.lunch["title"],
-        description=response.lunch["description"],
-        meal_type="lunch",
-        cook_time=response.lunch["cook_time"],
-        prep_time=response.lunch.get("prep_time", "15 minutes"),
-        servings=response.lunch.get("servings", 1),
-        cuisine=response.lunch.get("cuisine"),
-        difficulty=response.lunch.get("difficulty", "medium"),
-        calories=response.lunch["calories"],
-        protein_g=response.lunch["protein"],
-        carbs_g=response.lunch["carbs"],
-        fat_g=response.lunch["fat"],
-        ingredients=json.dumps(response.lunch["ingredients"]),
-        instructions=response.lunch["instructions"],
-        image_url=response.lunch.get("image_url", ""),
-        chroma_id=response.lunch.get("chroma_id", "")
-    )
-    
-    dinner_recipe = Recipe(
-        user_id=current_user.id,
-        title=response.dinner["title"],
-        description=response.dinner["description"],
-        meal_type="dinner",
-        cook_time=response.dinner["cook_time"],
-        prep_time=response.dinner.get("prep_time", "15 minutes"),
-        servings=response.dinner.get("servings", 1),
-        cuisine=response.dinner.get("cuisine"),
-        difficulty=response.dinner.get("difficulty", "medium"),
-        calories=response.dinner["calories"],
-        protein_g=response.dinner["protein"],
-        carbs_g=response.dinner["carbs"],
-        fat_g=response.dinner["fat"],
-        ingredients=json.dumps(response.dinner["ingredients"]),
-        instructions=response.dinner["instructions"],
-        image_url=response.dinner.get("image_url", ""),
-        chroma_id=response.dinner.get("chroma_id", "")
-    )
-    
-    db.add_all([breakfast_recipe, lunch_recipe, dinner_recipe])
-    db.commit()
+    recipe_ids = insert_meal_recipes(db, current_user.id, response)
+    breakfast_id, lunch_id, dinner_id = recipe_ids
     
     # Create daily meal plan
     daily_plan = DailyMealPlan(
         user_id=current_user.id,
-        date=datetime.now().date(),  # Use current date for database
-        breakfast_recipe_id=breakfast_recipe.id,
-        lunch_recipe_id=lunch_recipe.id,
-        dinner_recipe_id=dinner_recipe.id
+        date=today,  # Use current date for database
+        breakfast_recipe_id=breakfast_id,
+        lunch_recipe_id=lunch_id,
+        dinner_recipe_id=dinner_id
     )
     
     db.add(daily_plan)
-    db.commit()
     
-    # Store recipes in ChromaDB for preference learning
-    for recipe_data, recipe_obj in [
-        (response.breakfast, breakfast_recipe),
-        (response.lunch, lunch_recipe),
-        (response.dinner, dinner_recipe)
-    ]:
-        recipe_embedding = chroma_service.generate_embedding(
-            f"{recipe_data['title']} {recipe_data['description']} {', '.join([ing['name'] for ing in recipe_data['ingredients']])}"
-        )
-        
-        recipe_data_for_chroma = {
+    # Store recipes in ChromaDB for preference learning: one encode and one add for all three meals
+    meals = [getattr(response, meal_type) for meal_type in MEAL_TYPES]
+    # Same text as the other generation paths, so a recipe embeds identically wherever it is stored
+    recipe_embeddings = chroma_service.generate_embeddings_batch([build_recipe_text(recipe_data) for recipe_data in meals], persist=True)
+    
+    recipes_for_chroma = [
+        {
             "user_id": current_user.id,
-            "recipe_id": recipe_obj.id,
+            "recipe_id": recipe_id,
             "title": recipe_data["title"],
             "description": recipe_data["description"],
-            "meal_type": recipe_obj.meal_type,
+            "meal_type": meal_type,
             "cuisine": recipe_data.get("cuisine", ""),
             "calories": recipe_data["calories"],
             "ingredients": [ing["name"] for ing in recipe_data["ingredients"]]
         }
-        
-        chroma_id = chroma_service.store_recipe(recipe_data_for_chroma, recipe_embedding)
-        recipe_obj.chroma_id = chroma_id
-        db.commit()
+        for meal_type, recipe_id, recipe_data in zip(MEAL_TYPES, recipe_ids, meals)
+    ]
+    
+    chroma_ids = chroma_service.store_recipes_bulk(recipes_for_chroma, recipe_embeddings)
+    chroma_updates = [{"id": recipe_id, "chroma_id": chroma_id} for recipe_id, chroma_id in zip(recipe_ids, chroma_ids)]
+    
+    # Keep each vector with its recipe so later syncs and searches by ID need not re-embed
+    db.execute(insert(RecipeEmbedding), [
+        {"recipe_id": recipe_id, "vector": pack_embedding(embedding)}
+        for recipe_id, embedding in zip(recipe_ids, recipe_embeddings)
+    ])
+    
+    # Recipes, embeddings, plan and Chroma IDs land in a single commit
+    db.execute(update(Recipe), chroma_updates)
+    db.commit()
     
     log_api_call("/daily-meals/generate-by-day", "completed")
     
-    return response
+    return model_json_response(response)
 
 
 @app.post("/daily-meals/regenerate", tags=["Daily Meals"])
-async def regenerate_meal(
+def regenerate_meal(
     request: RegenerateMealRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -858,7 +915,7 @@ async def regenerate_meal(
         raise HTTPException(status_code=404, detail="Meal plan not found")
     
     # Get user profile
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
+    profile = current_user.profile
     
     # Generate new recipe for the meal type
     meal_request = DailyMealRequest(
@@ -871,25 +928,7 @@ async def regenerate_meal(
     new_recipe_data = generate_single_meal_with_claude(meal_request, request.meal_type, chroma_service, profile)
     
     # Create new recipe in database
-    new_recipe = Recipe(
-        user_id=current_user.id,
-        title=new_recipe_data["title"],
-        description=new_recipe_data["description"],
-        meal_type=request.meal_type,
-        cook_time=new_recipe_data["cook_time"],
-        prep_time=new_recipe_data.get("prep_time", "15 minutes"),
-        servings=new_recipe_data.get("servings", 1),
-        cuisine=new_recipe_data.get("cuisine"),
-        difficulty=new_recipe_data.get("difficulty", "medium"),
-        protein_g=new_recipe_data["protein"],
-        carbs_g=new_recipe_data["carbs"],
-        fat_g=new_recipe_data["fat"],
-        calories=new_recipe_data["calories"],
-        ingredients=new_recipe_data["ingredients"],
-        instructions=new_recipe_data["instructions"],
-        image_url=new_recipe_data.get("image_url", ""),
-        chroma_id=new_recipe_data.get("chroma_id", "")
-    )
+    new_recipe = Recipe(**recipe_row(current_user.id, request.meal_type, new_recipe_data))
     
     db.add(new_recipe)
     db.flush()  # Get ID
@@ -910,7 +949,7 @@ async def regenerate_meal(
     }
 
 @app.post("/daily-meals/feedback", tags=["Daily Meals"])
-async def submit_meal_feedback(
+def submit_meal_feedback(
     feedback: MealFeedbackRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -929,44 +968,43 @@ async def submit_meal_feedback(
     embedding = chroma_service.generate_embedding(json.dumps(preference_data))
     chroma_service.store_user_preference(current_user.id, preference_data, embedding)
     
-    # Store individual ingredient preferences
-    if feedback.disliked_ingredients:
-        for ingredient in feedback.disliked_ingredients:
-            pref_data = {
-                "user_id": current_user.id,
-                "preference_type": "disliked",
-                "item_name": ingredient,
-                "item_type": "ingredient",
-                "context": f"Disliked in meal on {feedback.date}",
-                "strength": 1.0
-            }
-            embedding = chroma_service.generate_embedding(ingredient)
-            chroma_service.store_user_preference(current_user.id, pref_data, embedding)
-    
-    if feedback.liked_ingredients:
-        for ingredient in feedback.liked_ingredients:
-            pref_data = {
-                "user_id": current_user.id,
-                "preference_type": "liked",
-                "item_name": ingredient,
-                "item_type": "ingredient",
-                "context": f"Liked in meal on {feedback.date}",
-                "strength": 1.0
-            }
-            embedding = chroma_service.generate_embedding(ingredient)
-            chroma_service.store_user_preference(current_user.id, pref_data, embedding)
+    # Store individual ingredient preferences: one batched encode and one Chroma add
+    ingredient_preferences = [
+        {
+            "user_id": current_user.id,
+            "preference_type": preference_type,
+            "item_name": ingredient,
+            "item_type": "ingredient",
+            "context": f"{preference_type.capitalize()} in meal on {feedback.date}",
+            "strength": 1.0
+        }
+        for preference_type, ingredients in (
+            ("disliked", feedback.disliked_ingredients),
+            ("liked", feedback.liked_ingredients)
+        )
+        for ingredient in ingredients or []
+    ]
+    
+    if ingredient_preferences:
+        embeddings = chroma_service.generate_embeddings_batch([pref["item_name"] for pref in ingredient_preferences], persist=True)
+        chroma_service.store_user_preferences_bulk(current_user.id, ingredient_preferences, embeddings)
     
     return {"message": "Feedback recorded for future recommendations"}
 
 @app.get("/daily-meals/{date}", tags=["Daily Meals"])
-async def get_daily_meals(
+def get_daily_meals(
     date: str,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get daily meal plan for a specific date"""
     
-    meal_plan = db.query(DailyMealPlan).filter(
+    # The plan and its three recipes come back in one joined query
+    meal_plan = db.query(DailyMealPlan).options(
+        joinedload(DailyMealPlan.breakfast_recipe).undefer_group("details"),
+        joinedload(DailyMealPlan.lunch_recipe).undefer_group("details"),
+        joinedload(DailyMealPlan.dinner_recipe).undefer_group("details")
+    ).filter(
         DailyMealPlan.user_id == current_user.id,
         DailyMealPlan.date == datetime.strptime(date, "%Y-%m-%d")
     ).first()
@@ -975,9 +1013,9 @@ async def get_daily_meals(
         raise HTTPException(status_code=404, detail="Meal plan not found")
     
     # Get recipes
-    breakfast = db.query(Recipe).filter(Recipe.id == meal_plan.breakfast_recipe_id).first()
-    lunch = db.query(Recipe).filter(Recipe.id == meal_plan.lunch_recipe_id).first()
-    dinner = db.query(Recipe).filter(Recipe.id == meal_plan.dinner_recipe_id).first()
+    breakfast = meal_plan.breakfast_recipe
+    lunch = meal_plan.lunch_recipe
+    dinner = meal_plan.dinner_recipe
     
     return {
         "date": date,
@@ -990,7 +1028,7 @@ async def get_daily_meals(
     }
 
 @app.get("/daily-meals", tags=["Daily Meals"])
-async def get_user_meal_plans(
+def get_user_meal_plans(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     limit: int = 30
@@ -1007,7 +1045,7 @@ async def get_user_meal_plans(
 #==================== GROCERY SHOPPING ENDPOINTS ====================
 
 @app.post("/grocery/from-recipe", tags=["Grocery Shopping"])
-async def create_grocery_list_from_recipe(
+def create_grocery_list_from_recipe(
     recipe: RecipeForGrocery,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1031,11 +1069,11 @@ async def create_grocery_list_from_recipe(
         Grocery list with Kroger product details, prices, and images
     """
     log_api_call("/grocery/from-recipe", "started")
-    logger.info(f"Creating grocery list from recipe for user: {current_user.username}")
+    logger.info("Creating grocery list from recipe for user: %s", current_user.username)
     
     try:
         # Import Kroger API functions from grocery agent
-        from agents.grocery_agent.agent import search_and_price_ingredient
+        from agents.grocery_agent.agent import price_ingredients
         
         # Extract ingredients from recipe
         ingredients = recipe.ingredients
@@ -1049,18 +1087,15 @@ async def create_grocery_list_from_recipe(
         total_cost = 0.0
         kroger_items_found = 0
         
-        # Search Kroger for each ingredient using the same function as /grocery endpoint
-        for ingredient in ingredients:
-            ingredient_name = ingredient.name
-            quantity = ingredient.quantity
-            unit = ingredient.unit
-            
-            if not ingredient_name:
-                continue
-            
-            # Use the same search_and_price_ingredient function that works in /grocery
-            item_details = search_and_price_ingredient(ingredient_name, quantity, unit)
-            
+        # Search Kroger for all ingredients concurrently, using the same pricing as /grocery
+        named_ingredients = [
+            (ingredient.name, ingredient.quantity, ingredient.unit)
+            for ingredient in ingredients
+            if ingredient.name
+        ]
+        all_item_details = price_ingredients(named_ingredients)
+        
+        for (ingredient_name, quantity, unit), item_details in zip(named_ingredients, all_item_details):
             # ONLY include items found on Kroger - no fallback
             if item_details.get("found") and item_details.get("source") == "kroger_api":
                 # Found on Kroger
@@ -1088,7 +1123,7 @@ async def create_grocery_list_from_recipe(
                     total_cost += estimated_price
             else:
                 # Skip items not found on Kroger
-                logger.info(f"⏭️  Skipping '{ingredient_name}' - not found on Kroger")
+                logger.info("⏭️  Skipping '%s' - not found on Kroger", ingredient_name)
         
         # Create grocery list in database
         grocery_list = db_create_grocery_list(db, current_user.id, {
@@ -1106,7 +1141,7 @@ async def create_grocery_list_from_recipe(
             order_url = f"https://www.kroger.com/search?query={search_terms}"
         
         log_api_call("/grocery/from-recipe", "completed")
-        logger.info(f"Created grocery list with {len(grocery_items)} items, {kroger_items_found} from Kroger")
+        logger.info("Created grocery list with %s items, %s from Kroger", len(grocery_items), kroger_items_found)
         
         return {
             "agent": "GroceryAgent",
@@ -1123,7 +1158,7 @@ async def create_grocery_list_from_recipe(
         }
         
     except Exception as e:
-        logger.error(f"Grocery from recipe error: {e}")
+        logger.error("Grocery from recipe error: %s", e)
         log_api_call("/grocery/from-recipe", "failed")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1133,30 +1168,30 @@ async def create_grocery_list_from_recipe(
 
 #==================== RECIPE MANAGEMENT ENDPOINTS ====================
 
-@app.get("/recipes", tags=["Recipes"])
-async def get_saved_recipes(
+@app.get("/recipes", response_model=RecipesResponse, tags=["Recipes"])
+def get_saved_recipes(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get user's saved recipes"""
-    recipes = db.query(Recipe).filter(Recipe.user_id == current_user.id).all()
+    recipes = db.query(Recipe).options(undefer_group("details")).filter(Recipe.user_id == current_user.id).all()
     return {"recipes": recipes}
 
 
-@app.post("/recipes/save", tags=["Recipes"])
-async def save_recipe_endpoint(
+@app.post("/recipes/save", response_model=SaveRecipeResponse, tags=["Recipes"])
+def save_recipe_endpoint(
     recipe_data: dict,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Save a recipe to user's collection"""
     recipe = db_save_recipe(db, current_user.id, recipe_data)
-    logger.info(f"Recipe saved by {current_user.username}: {recipe_data.get('title')}")
+    logger.info("Recipe saved by %s: %s", current_user.username, recipe_data.get('title'))
     return {"message": "Recipe saved successfully", "recipe": recipe}
 
 
 @app.post("/recipes/{recipe_id}/favorite", tags=["Recipes"])
-async def toggle_favorite(
+def toggle_favorite(
     recipe_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1179,24 +1214,22 @@ async def toggle_favorite(
 # ==================== GROCERY LIST MANAGEMENT ====================
 
 @app.get("/grocery-lists", tags=["Grocery"])
-async def get_grocery_lists(
+def get_grocery_lists(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get user's grocery lists"""
-    lists = db.query(GroceryList).filter(GroceryList.user_id == current_user.id).all()
+    lists = db.query(GroceryList).options(undefer_group("details")).filter(GroceryList.user_id == current_user.id).all()
     return {"lists": lists}
 
 
 @app.post("/grocery-lists/{list_id}/complete", tags=["Grocery"])
-async def complete_grocery_list(
+def complete_grocery_list(
     list_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Mark grocery list as completed"""
-    from datetime import datetime
-    
     grocery_list = db.query(GroceryList).filter(
         GroceryList.id == list_id,
         GroceryList.user_id == current_user.id
@@ -1214,27 +1247,25 @@ async def complete_grocery_list(
 
 # ==================== MEAL LOGGING ====================
 
-@app.post("/meals/log", tags=["Meals"])
-async def log_meal_endpoint(
+@app.post("/meals/log", response_model=LogMealResponse, tags=["Meals"])
+def log_meal_endpoint(
     meal_data: dict,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Log a meal in history"""
     meal = db_log_meal(db, current_user.id, meal_data)
-    logger.info(f"Meal logged by {current_user.username}: {meal_data.get('recipe_title')}")
+    logger.info("Meal logged by %s: %s", current_user.username, meal_data.get('recipe_title'))
     return {"message": "Meal logged successfully", "meal": meal}
 
 
-@app.get("/meals/history", tags=["Meals"])
-async def get_meal_history(
+@app.get("/meals/history", response_model=MealHistoryResponse, tags=["Meals"])
+def get_meal_history(
     days: int = 7,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get user's meal history"""
-    from datetime import datetime, timedelta
-    
     since_date = datetime.utcnow() - timedelta(days=days)
     meals = db.query(MealHistory).filter(
         MealHistory.user_id == current_user.id,
@@ -1246,30 +1277,24 @@ async def get_meal_history(
 
 # ==================== USER STATISTICS ====================
 
-@app.get("/stats", tags=["User Stats"])
-async def get_user_stats(
+@app.get("/stats", response_model=StatsResponse, tags=["User Stats"])
+def get_user_stats(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get user statistics"""
-    from sqlalchemy import func
-    
-    total_recipes = db.query(func.count(Recipe.id)).filter(
-        Recipe.user_id == current_user.id
-    ).scalar()
-    
-    total_grocery_lists = db.query(func.count(GroceryList.id)).filter(
-        GroceryList.user_id == current_user.id
-    ).scalar()
-    
-    total_meals = db.query(func.count(MealHistory.id)).filter(
-        MealHistory.user_id == current_user.id
-    ).scalar()
-    
-    favorite_recipes = db.query(func.count(Recipe.id)).filter(
-        Recipe.user_id == current_user.id,
-        Recipe.is_favorite == True
-    ).scalar()
+    def count_for_user(model):
+        return select(func.count(model.id)).where(model.user_id == current_user.id).scalar_subquery()
+    
+    # All four counts in one round-trip; both recipe counts come from a single pass
+    total_recipes, favorite_recipes, total_grocery_lists, total_meals = db.execute(
+        select(
+            func.count(Recipe.id),
+            func.coalesce(func.sum(case((Recipe.is_favorite == True, 1), else_=0)), 0),
+            count_for_user(GroceryList),
+            count_for_user(MealHistory)
+        ).where(Recipe.user_id == current_user.id)
+    ).one()
     
     return {
         "total_recipes": total_recipes,
@@ -1281,47 +1306,56 @@ async def get_user_stats(
 
 # ==================== AGENT METADATA ====================
 
+# Serialized once at import; pollers hit this often
+AGENTS_METADATA = {
+    "agents": [
+        {
+            "name": "RecipeAgent",
+            "handle": "@agentic-grocery-recipes",
+            "description": "Intelligent recipe generator using Claude AI that creates personalized meal options based on user preferences, dietary goals, and macros",
+            "tags": ["nutrition", "recipes", "meal-planning", "fetchai", "agentic-ai", "claude", "ai-powered"],
+            "endpoint": "http://localhost:8000/recipe",
+            "version": "0.3.0",
+            "protocol": "chat-protocol-v0.3.0",
+            "capabilities": ["recipe_generation", "macro_calculation", "dietary_personalization", "claude_integration"]
+        },
+        {
+            "name": "GroceryAgent",
+            "handle": "@agentic-grocery-shopping",
+            "description": "Automated grocery list builder that extracts ingredients from recipes and uses Kroger API for real product pricing and availability",
+            "tags": ["grocery", "shopping", "kroger", "fetchai", "agentic-ai", "automation", "e-commerce"],
+            "endpoint": "http://localhost:8000/grocery",
+            "version": "0.3.0",
+            "protocol": "chat-protocol-v0.3.0",
+            "capabilities": ["ingredient_extraction", "price_estimation", "kroger_integration", "list_generation"]
+        }
+    ],
+    "system": {
+        "framework": "Fetch.ai uAgents",
+        "api_framework": "FastAPI",
+        "llm": "Anthropic Claude",
+        "grocery_api": "Kroger",
+        "database": "SQLite + SQLAlchemy",
+        "authentication": "JWT",
+        "documentation": "https://github.com/yourusername/agentic-grocery"
+    }
+}
+AGENTS_METADATA_RESPONSE_BODY = orjson.dumps(AGENTS_METADATA)
+AGENTS_METADATA_ETAG = etag_for(AGENTS_METADATA_RESPONSE_BODY)
+AGENTS_METADATA_MAX_AGE_SECONDS = 60
+
+
 @app.get("/agents-metadata", tags=["System"])
-async def get_agents_metadata():
+async def get_agents_metadata(request: Request):
     """
     Returns agent metadata for Agentverse registration.
     Metadata is embedded in each agent's docstring following ASI:One best practices.
     
     Reference: https://docs.agentverse.ai/documentation/getting-started/overview
     """
-    return {
-        "agents": [
-            {
-                "name": "RecipeAgent",
-                "handle": "@agentic-grocery-recipes",
-                "description": "Intelligent recipe generator using Claude AI that creates personalized meal options based on user preferences, dietary goals, and macros",
-                "tags": ["nutrition", "recipes", "meal-planning", "fetchai", "agentic-ai", "claude", "ai-powered"],
-                "endpoint": "http://localhost:8000/recipe",
-                "version": "0.3.0",
-                "protocol": "chat-protocol-v0.3.0",
-                "capabilities": ["recipe_generation", "macro_calculation", "dietary_personalization", "claude_integration"]
-            },
-            {
-                "name": "GroceryAgent",
-                "handle": "@agentic-grocery-shopping",
-                "description": "Automated grocery list builder that extracts ingredients from recipes and uses Kroger API for real product pricing and availability",
-                "tags": ["grocery", "shopping", "kroger", "fetchai", "agentic-ai", "automation", "e-commerce"],
-                "endpoint": "http://localhost:8000/grocery",
-                "version": "0.3.0",
-                "protocol": "chat-protocol-v0.3.0",
-                "capabilities": ["ingredient_extraction", "price_estimation", "kroger_integration", "list_generation"]
-            }
-        ],
-        "system": {
-            "framework": "Fetch.ai uAgents",
-            "api_framework": "FastAPI",
-            "llm": "Anthropic Claude",
-            "grocery_api": "Kroger",
-            "database": "SQLite + SQLAlchemy",
-            "authentication": "JWT",
-            "documentation": "https://github.com/yourusername/agentic-grocery"
-        }
-    }
+    return cached_json_response(
+        request, AGENTS_METADATA_RESPONSE_BODY, AGENTS_METADATA_ETAG, AGENTS_METADATA_MAX_AGE_SECONDS
+    )
 
 
 # Error handlers
@@ -1348,8 +1382,10 @@ if __name__ == "__main__":
     
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
+    # Each worker is a separate process with its own embedding model and Chroma store
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
     
-    logger.info(f"🚀 Starting Agentic Grocery API on {host}:{port}")
+    logger.info("🚀 Starting Agentic Grocery API on %s:%s (%s worker(s))", host, port, workers)
     logger.info("📚 API Documentation: http://localhost:8000/docs")
     logger.info("🔍 Alternative docs: http://localhost:8000/redoc")
     
@@ -1357,7 +1393,8 @@ if __name__ == "__main__":
         "main:app",
         host=host,
         port=port,
-        reload=True,
+        workers=workers,
+        reload=workers == 1,  # uvicorn cannot reload with multiple workers
         log_level="info"
     )
 
@@ -3,7 +3,7 @@ Utilities package for Agentic Grocery
 Contains logging and helper functions
 """
 
-from .logger import setup_logger, log_agent_message, log_api_call
+from .logger import setup_logger, log_agent_message, log_api_call, drain_api_logs
 
-__all__ = ["setup_logger", "log_agent_message", "log_api_call"]
+__all__ = ["setup_logger", "log_agent_message", "log_api_call", "drain_api_logs"]
 
@@ -3,8 +3,11 @@ Logger utility for Agentic Grocery project.
 Uses rich for beautiful console output and structured logging.
 """
 
+import asyncio
 import logging
+import queue
 import sys
+import time
 from rich.console import Console
 from rich.logging import RichHandler
 from rich.traceback import install as install_rich_traceback
@@ -46,13 +49,14 @@ def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
     return logger
 
 
-def log_agent_message(agent_name: str, message: str, level: str = "info"):
+def log_agent_message(agent_name: str, message: str, *args, level: str = "info"):
     """
     Log a message with agent-specific formatting.
     
     Args:
         agent_name: Name of the agent logging the message
-        message: Message to log
+        message: Message to log, optionally with %-style placeholders
+        *args: Values for the placeholders in message
         level: Log level (info, warning, error, debug)
     """
     color_map = {
@@ -61,22 +65,74 @@ def log_agent_message(agent_name: str, message: str, level: str = "info"):
         "GroceryAgent": "yellow"
     }
     color = color_map.get(agent_name, "white")
+    if args:
+        message = message % args
     console.print(f"[bold {color}][{agent_name}][/bold {color}] {message}")
 
 
+API_LOG_STATUS_COLORS = {
+    "started": "blue",
+    "completed": "green",
+    "failed": "red"
+}
+API_LOG_BATCH_SIZE = 100
+API_LOG_FLUSH_INTERVAL = 0.2
+
+# Thread-safe so sync routes running in the threadpool can enqueue without the event loop
+api_log_queue: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+_api_log_worker_running = False
+
+
+def _write_api_calls(events):
+    """Print a batch of (endpoint, status, timestamp) API call events."""
+    for endpoint, status, _ in events:
+        color = API_LOG_STATUS_COLORS.get(status, "white")
+        console.print(f"[{color}]API {status.upper()}: {endpoint}[/{color}]")
+
+
+def _drain_api_log_queue(limit: int):
+    """Pop up to limit pending events without blocking."""
+    events = []
+    while len(events) < limit:
+        try:
+            events.append(api_log_queue.get_nowait())
+        except queue.Empty:
+            break
+    return events
+
+
+async def drain_api_logs():
+    """
+    Background task writing queued API call events in batches.
+    
+    Wakes every API_LOG_FLUSH_INTERVAL seconds and prints up to API_LOG_BATCH_SIZE
+    events per write, off the event loop. Remaining events are flushed on cancel.
+    """
+    global _api_log_worker_running
+    _api_log_worker_running = True
+    try:
+        while True:
+            await asyncio.sleep(API_LOG_FLUSH_INTERVAL)
+            while events := _drain_api_log_queue(API_LOG_BATCH_SIZE):
+                await asyncio.to_thread(_write_api_calls, events)
+    finally:
+        _api_log_worker_running = False
+        _write_api_calls(_drain_api_log_queue(sys.maxsize))
+
+
 def log_api_call(endpoint: str, status: str = "started"):
     """
     Log API call information.
     
+    While the drain_api_logs task is running the event is only queued, keeping
+    console I/O off the request path; otherwise it is printed immediately.
+    
     Args:
         endpoint: API endpoint being called
         status: Status of the call (started, completed, failed)
     """
-    status_color = {
-        "started": "blue",
-        "completed": "green",
-        "failed": "red"
-    }
-    color = status_color.get(status, "white")
-    console.print(f"[{color}]API {status.upper()}: {endpoint}[/{color}]")
-
+    event = (endpoint, status, time.monotonic())
+    if _api_log_worker_running:
+        api_log_queue.put_nowait(event)
+    else:
+        _write_api_calls((event,))